@@ -0,0 +1,195 @@
+import sqlite3
+import threading
+import time
+
+from grading import GRADING_CONFIG
+
+
+class ResultsStore:
+    """Graded results as numbers: per-code error counts and C1/C2/C3/total scores in SQLite.
+
+    The Sheet keeps the feedback text for reading; this keeps one row per
+    submission plus one row per (code, status) count. Task and group are
+    copied onto the counts so the aggregations run on a covering index
+    without a join; class-level questions become GROUP BY queries instead of
+    reading markdown.
+    """
+
+    def __init__(self, path="results.sqlite3"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS submissions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_key TEXT NOT NULL,
+                task TEXT NOT NULL,
+                grp TEXT NOT NULL,
+                students TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                created REAL NOT NULL,
+                word_count INTEGER NOT NULL,
+                c1 REAL, c2 REAL, c3 REAL, total REAL
+            );
+            CREATE TABLE IF NOT EXISTS code_counts (
+                submission_id INTEGER NOT NULL REFERENCES submissions (id),
+                task TEXT NOT NULL,
+                grp TEXT NOT NULL,
+                criterion TEXT NOT NULL,
+                code TEXT NOT NULL,
+                status TEXT NOT NULL,
+                count INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS submissions_kind ON submissions (kind, task, grp);
+            CREATE INDEX IF NOT EXISTS code_counts_submission ON code_counts (submission_id);
+            -- Covers the aggregations: they never touch the table itself
+            CREATE INDEX IF NOT EXISTS code_counts_status ON code_counts (status, task, grp, criterion, code, count);
+        """)
+        self._db.commit()
+
+    def _insert(self, submission, counts):
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO submissions (session_key, task, grp, students, kind, created, word_count, "
+                "c1, c2, c3, total) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", submission)
+            self._db.executemany(
+                "INSERT INTO code_counts (submission_id, task, grp, criterion, code, status, count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", [(cursor.lastrowid, submission[1], submission[2], *row) for row in counts])
+            self._db.commit()
+
+    def record_first(self, session_key, task_id, group, students, data, scores, word_count):
+        # data is None for a text too short to be marked
+        counts = []
+        for criterion in ("C1", "C2"):
+            for code, errors in (data or {}).get(criterion, {}).items():
+                if code != "CONN" and errors:
+                    counts.append((criterion, code, "error", len(errors)))
+        self._insert((session_key, task_id, group, students, "first", time.time(), word_count, *scores), counts)
+
+    def record_revision(self, session_key, task_id, group, students, audit_data, word_count):
+        counts = []
+        for criterion, codes in audit_data.get("audit", {}).items():
+            for code, instances in codes.items():
+                statuses = {}
+                for inst in instances:
+                    statuses[inst["status"]] = statuses.get(inst["status"], 0) + 1
+                counts += [(criterion, code, status, n) for status, n in statuses.items()]
+        if audit_data.get("new_errors"):
+            counts.append(("", "NEW", "new", len(audit_data["new_errors"])))
+        self._insert((session_key, task_id, group, students, "revision", time.time(), word_count,
+                      None, None, None, None), counts)
+
+    def _where(self, task, group, first_column, first_value):
+        clauses, params = [f"{first_column} = ?"], [first_value]
+        if task:
+            clauses.append("task = ?")
+            params.append(task)
+        if group:
+            clauses.append("grp = ?")
+            params.append(group)
+        return " AND ".join(clauses), params
+
+    def _query(self, sql, params):
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def error_frequencies(self, task=None, group=None, config=GRADING_CONFIG):
+        # Per group and code, in first drafts: how many errors and how many submissions had one
+        where, params = self._where(task, group, "kind", "first")
+        totals = {row["grp"]: row["n"] for row in self._query(
+            f"SELECT grp, COUNT(*) AS n FROM submissions WHERE {where} GROUP BY grp", params)}
+        where, params = self._where(task, group, "status", "error")
+        rows = self._query(f"""
+            SELECT grp, criterion, code, SUM(count) AS errors, COUNT(*) AS submissions_with_error
+            FROM code_counts WHERE {where}
+            GROUP BY grp, criterion, code
+            ORDER BY grp, errors DESC
+        """, params)
+        for row in rows:
+            row["submissions"] = totals.get(row["grp"], 0)
+            row["label"] = config.get(row["criterion"], {}).get("rules", {}).get(row["code"], {}).get("label",
+                                                                                                   row["code"])
+            row["errors_per_submission"] = round(row["errors"] / row["submissions"], 2) if row["submissions"] else 0
+        return rows
+
+    def score_summary(self, task=None, group=None):
+        where, params = self._where(task, group, "kind", "first")
+        return self._query(f"""
+            SELECT grp, COUNT(*) AS submissions,
+                   ROUND(AVG(c1), 2) AS c1, ROUND(AVG(c2), 2) AS c2,
+                   ROUND(AVG(c3), 2) AS c3, ROUND(AVG(total), 2) AS total,
+                   MIN(total) AS min_total, MAX(total) AS max_total
+            FROM submissions WHERE {where}
+            GROUP BY grp ORDER BY grp
+        """, params)
+
+    def score_distribution(self, task=None, group=None):
+        # Final marks bucketed to whole points, per group
+        where, params = self._where(task, group, "kind", "first")
+        return self._query(f"""
+            SELECT grp, CAST(total AS INTEGER) AS mark, COUNT(*) AS submissions
+            FROM submissions WHERE {where}
+            GROUP BY grp, mark ORDER BY grp, mark
+        """, params)
+
+    def fix_rates(self, task=None, group=None, config=GRADING_CONFIG):
+        # Of the first-draft errors checked in a revision, how many were fixed
+        counts = {}
+        for status in ("fixed", "incorrectly_fixed", "still_present", "new"):
+            where, params = self._where(task, group, "status", status)
+            for row in self._query(f"SELECT criterion, code, SUM(count) AS n FROM code_counts WHERE {where} "
+                                   "GROUP BY criterion, code", params):
+                entry = counts.setdefault((row["criterion"], row["code"]), {
+                    "criterion": row["criterion"], "code": row["code"],
+                    "fixed": 0, "incorrectly_fixed": 0, "still_present": 0, "new": 0})
+                entry[status] = row["n"]
+        rows = [counts[key] for key in sorted(counts)]
+        for row in rows:
+            checked = row["fixed"] + row["incorrectly_fixed"] + row["still_present"]
+            row["label"] = config.get(row["criterion"], {}).get("rules", {}).get(row["code"], {}).get(
+                "label", "New errors" if row["code"] == "NEW" else row["code"])
+            row["fix_rate"] = round(row["fixed"] / checked, 2) if checked else None
+        return rows
+
+    def groups(self, task=None):
+        sql = "SELECT DISTINCT grp FROM submissions" + (" WHERE task = ?" if task else "") + " ORDER BY grp"
+        return [row["grp"] for row in self._query(sql, [task] if task else [])]
+
+
+if __name__ == "__main__":
+    # Query timings over synthetic submissions:  python analytics.py [n_submissions]
+    import os
+    import random
+    import sys
+    import tempfile
+
+    from bench_scoring import synthetic_result
+    from grading import compute_mark
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = random.Random(3)
+    store = ResultsStore(os.path.join(tempfile.mkdtemp(), "results.sqlite3"))
+    groups = ["3A", "3C", "4A", "4B", "4C"]
+    started = time.perf_counter()
+    for i in range(n):
+        data, word_count = synthetic_result(rng), rng.randint(66, 200)
+        group = rng.choice(groups)
+        store.record_first(f"s{i}", "default", group, f"Student {i}", data, compute_mark(data, word_count),
+                           word_count)
+        audit = {"audit": {c: {code: [{"q": "q", "status": rng.choice(["fixed", "fixed", "still_present",
+                                                                          "incorrectly_fixed"]), "comment": ""}
+                                      for _ in errors]
+                               for code, errors in data[c].items() if code != "CONN"}
+                           for c in ("C1", "C2")},
+                 "new_errors": [{"q": "q", "r": "r"}] * rng.randint(0, 2)}
+        store.record_revision(f"s{i}", "default", group, f"Student {i}", audit, word_count)
+    print(f"recorded {n} first drafts + {n} revisions in {time.perf_counter() - started:.1f}s")
+
+    for name, query in [("error_frequencies", store.error_frequencies), ("score_summary", store.score_summary),
+                        ("score_distribution", store.score_distribution), ("fix_rates", store.fix_rates)]:
+        for label, kwargs in [("all groups", {}), ("one group", {"group": "4B"})]:
+            started = time.perf_counter()
+            rows = query(**kwargs)
+            print(f"{name:19} {label:10} {(time.perf_counter() - started) * 1000:7.1f} ms ({len(rows)} rows)")
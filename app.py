@@ -1,262 +1,36 @@
 import streamlit as st
 import requests
-import re
 import time
 import json
+import contextlib
+from gemini_client import DEFAULT_BASE_URL, DEFAULT_MODEL, GeminiClient, GeminiError
+from scheduler import RequestScheduler
+from grading_cache import GradingCache
+from grading import check_revision, count_words, format_partial_feedback, grade_essay
+from response_schema import ResponseFormatError
+from prescreen import PreScreen
+from session_store import SessionStore, session_key
+from sheet_outbox import SheetOutbox
+from stream_parser import TopLevelObjectParser
+from tasks import TaskRegistry
+from teacher_view import render_teacher_view
+from analytics import ResultsStore
+from live_checks import format_live_report, live_report
+from metrics import Metrics
+from model_router import ModelRouter, build_backend
 
 # 1. SETUP
 API_KEY = st.secrets["GEMINI_API_KEY"]
 SHEET_URL = st.secrets["GOOGLE_SHEET_URL"]
 DEBUG = False
+# Per-stage latency table in the sidebar, for the teacher only
+ADMIN_METRICS = False
+# Stream the first feedback and show each criterion as soon as it arrives
+STREAM_FEEDBACK = st.secrets.get("GEMINI_STREAMING", False)
+# Word count, lowercase "i" and connector checks under the text box, before any model call
+LIVE_CHECKS = st.secrets.get("LIVE_CHECKS", False)
 
-
-# GRADING CONFIGURATION
-MIN_ESSAI_WORD_COUNT = 65
-GRADING_CONFIG = {
-    "C1": {
-        "start_score": 4.0,
-        "rules": {
-            "MPoPOC": {"penalty": 0.5, "type": "once", "label": "Organization/Paragraphs"},
-            "WRF": {"penalty": 0.5, "type": "once", "label": "Register/Format"},
-            "WG": {"penalty": 1.0, "type": "once", "label": "Genre Accuracy"},
-            "MCP": {"penalty": 0.5, "type": "list", "label": "Content Points"},
-            "CS": {"penalty": 0.2, "type": "list", "label": "Comma Splices"},
-            "IC": {"penalty": 0.2, "type": "list", "label": "Introductory Commas"},
-            "GP": {"penalty": 0.3, "type": "list", "label": "General Punctuation"},
-        }
-    },
-    "C2": {
-        "start_score": 4.0,
-        "rules": {
-            "SpCap": {"penalty": 0.2, "type": "list", "label": "Spelling/Caps"},
-            "WWO": {"penalty": 0.3, "type": "list", "label": "Word Order"},
-            "VTF": {"penalty": 0.3, "type": "list", "label": "Verb Tense/Form"},
-            "SVA": {"penalty": 0.5, "type": "list", "label": "Subject-Verb Agreement"},
-            "ART": {"penalty": 0.3, "type": "list", "label": "Articles"},
-            "PREP": {"penalty": 0.2, "type": "list", "label": "Prepositions"},
-            "PRO": {"penalty": 0.3, "type": "list", "label": "Pronouns"},
-            "COLL": {"penalty": 0.1, "type": "list", "label": "Collocations"},
-            "SI": {"penalty": 0.5, "type": "once", "label": "Small 'i' usage"},
-            "CSU": {"penalty": 0.3, "type": "list", "label": "Comparatives/Superlatives"},
-        }
-    }
-}
-
-# --- TASK CONFIGURATION ---
-TASK_DESC = "This is your last year at school and you are planning your end of year trip together with your classmates and teachers. Write an email to Liam, your exchange partner from last year, who has just sent you an email. Tell him about your plans for the trip: the places you are going to visit, the activities you are going to do there, and also about your classmates, friends and family."
-
-REQUIRED_CONTENT_POINTS = [
-    "Plans for the trip",
-    "Places you are going to visit",
-    "Activities you are going to do",
-    "Information about classmates, friends, and family"
-]
-
-# 2. THE STERN TEACHER PROMPT
-RUBRIC_INSTRUCTIONS = """
-### ROLE: LINGUISTIC ANALYST (STRICT EXAMINER)
-You are a meticulous British English Examiner. The level of your students is B2 in CEFR. Your task is to analyze the student's text and categorize every error found into a specific JSON structure.
-
-### RULES:
-1. **NO ANSWERS**: Never provide the corrected version of an error. 
-2. **EXHAUSTIVE**: You must catch and categorize every single mistake.
-3. **ONLY JSON**: Your entire output must be a single, valid JSON object.
-4. **NO CEFR MENTION**: Never use "B2" or "CEFR" in the feedback.
-
-### ERROR CATEGORIZATION LOGIC:
-You must distinguish between **Global Issues** (listed once) and **Specific Occurrences** (list every instance).
-
-### KEY DEFINITIONS (Use these codes):
-#### Criterion 1 (Adequació):
-- `MPoPOC`: Missing Paragraphs or poorly organized content.
-- `WRF`: Wrong Register/Format (e.g., formal vs informal).
-- `WG`: Wrong Genre (e.g., writing a story instead of an email).
-- `MCP`: Missing Content Points (From the list provided).
-- `CS`: Comma Splices (Joining two sentences with only a comma).
-- `IC`: Missing Introductory Commas (After "First of all", "Yesterday", etc.).
-- `GP`: General Punctuation (Missing full stops, capital letters at start of sentences).
-- `CONN`: List of every connector used (e.g., "but", "however", "firstly").
-
-#### Criterion 2 (Morfosintaxi):
-- `SpCap`: Spelling or Capitalization errors (except counted in `GP`)
-- `WWO`: Wrong Word Order. (examples of wrong: "We will miss each so much other", "I always am happy")
-- `VTF`: Verb Tense or Verb Form errors. (examples of wrong verb tense: "we went to Italy tomorrow", "I have played football yesterday")
-- `SVA`: Subject-Verb Agreement. (examples of wrong: "she play football", "Has I been here before?", "She are playing")
-- `ART`: Missing or wrong Articles (a, an, the). (examples of wrong: "an hotel", "I like sea", "I live on an island. An island is beautiful.")
-- `PREP`: Wrong Prepositions.
-- `PRO`: Pronoun errors. (examples of wrong: "me and my friends study English", "This book is for they", "this book is my")
-- `COLL`: Lexical Collocations (words that don't sound natural together). (example of wrong: "take dinner", "make exam", "do the bed", "make a photo")
-- `SI`: Use of lowercase 'i' instead of uppercase 'I'.
-- `CSU`: Comparative or Superlative errors.
-
-#### Criterion 3 (Lèxic):
-- `VOC`: Vocabulary level (Must be "2.0", "1.0", or "0.0"). Depending on this criterion:
-    - 2.0 (Rich): High variety of vocabulary, sophisticated phrasing, and appropriate use of idioms or advanced words.
-    - 1.0 (Limited): Repetitive vocabulary, basic word choices, but sufficient for the task.
-    - 0.0 (Poor): Very basic or incorrect vocabulary that hinders communication.
-
-### JSON FORMATTING:
-- Every value except `CONN`, `VOC`, and `IMP` must be a LIST of OBJECTS: `{"q": "quote", "r": "rule"}`. quote must be the specific quote of the text and rule is the explain the grammar rule behind it. If it's a spelling mistake just say something like: check the spelling this word.
-- If no error is found in this category, return an empty list `[]`.
-
-### OUTPUT STRUCTURE:
-{
-  "C1": {
-    "MPoPOC": [], "WRF": [], "WG": [], "MCP": [], 
-    "CS": [], "IC": [], "GP": [], "CONN": []
-  },
-  "C2": {
-    "SpCap": [], "WWO": [], "VTF": [], 
-    "SVA": [],  "ART": [], "PREP": [], "PRO": [], "COLL": [], 
-    "SI": [], "CSU": []
-  },
-  "C3": {"VOC": "1.0"},
-  "OVERALL": {"IMP": "Brief general impression."}
-}
-"""
-
-def compute_mark(data, word_count):
-    # Calculate C1
-    c1_score = GRADING_CONFIG["C1"]["start_score"]
-    for key, rule in GRADING_CONFIG["C1"]["rules"].items():
-        errors = data["C1"].get(key, [])
-        count = 1 if rule["type"] == "once" and errors else len(errors)
-        c1_score -= (count * rule["penalty"])
-    
-    # Connector Penalty logic
-    conns = data["C1"].get("CONN", [])
-    if len(conns) < 5 or len(set(conns)) < 3:
-        c1_score -= 1.0
-    c1_score = max(0, c1_score)
-
-    # Calculate C2
-    c2_score = GRADING_CONFIG["C2"]["start_score"]
-    for key, rule in GRADING_CONFIG["C2"]["rules"].items():
-        errors = data["C2"].get(key, [])
-        count = 1 if rule["type"] == "once" and errors else len(errors)
-        c2_score -= (count * rule["penalty"])
-    c2_score = max(0, c2_score)
-
-    # C3
-    c3_score = float(data["C3"].get("VOC", 1.0))
-
-    total = c1_score + c2_score + c3_score
-    if word_count < 80:
-        total = total / 2
-        
-    return round(c1_score, 2), round(c2_score, 2), c3_score, round(total, 2)
-
-def format_feedback(data, scores):
-    c1_s, c2_s, c3_s, total = scores
-    output = f"\n**Overall Impression:** {data['OVERALL']['IMP']}\n\n---\n"
-    
-    # Format C1
-    output += f"###### **Adequació, coherència i cohesió (Score: {str(c1_s).replace('.', ',')}/4)**\n"
-    for key, rule in GRADING_CONFIG["C1"]["rules"].items():
-        errors = data["C1"].get(key, [])
-        if errors:
-            output += f"* **{rule['label']}:**\n"
-            for e in errors:
-                if isinstance(e, dict):
-                    output += f"  - *{e['q']}*: {e['r']}\n"
-                else:
-                    output += f"  - {e}\n"
-                    
-    # Format C2
-    output += f"\n###### **Morfosintaxi i ortografia (Score: {str(c2_s).replace('.', ',')}/4)**\n"
-    for key, rule in GRADING_CONFIG["C2"]["rules"].items():
-        errors = data["C2"].get(key, [])
-        if errors:
-            output += f"* **{rule['label']}:**\n"
-            for e in errors:
-                output += f"  - *{e['q']}*: {e['r']}\n" if isinstance(e, dict) else f"  - {e}\n"
-
-    output += f"\n###### **Lèxic (Score: {str(c3_s).replace('.', ',')}/2)**\n"
-    output += f"\n---\n###### **FINAL MARK: {str(total).replace('.', ',')}/10**"
-    if total < 4.0: output += "\n\n⚠️ *Length penalty applied or significant errors found.*"
-    return output
-
-def format_revision_feedback(audit_data):
-    status_map = {
-        "fixed": "✅ **Fixed:**",
-        "still_present": "❌ **Still present:**",
-        "incorrectly_fixed": "⚠️ **Incorrectly fixed:**"
-    }
-    
-    output = f"\n\n**Overall Revision Summary:** {audit_data['OVERALL']}\n\n"
-    output += f"**Vocabulary status:** {audit_data['VOC_CHANGE']}\n\n---\n"
-    
-    # --- CRITERION 1: Adequació ---
-    c1_audit = audit_data["audit"].get("C1", {})
-    # Only show header if there is at least one subcategory with items
-    if any(instances for instances in c1_audit.values()):
-        output += "###### **Adequació, coherència i cohesió**\n"
-        for code, instances in c1_audit.items():
-            if instances: # Only show the subcategory (e.g., Comma Splices) if it has items
-                label = GRADING_CONFIG["C1"]["rules"].get(code, {}).get("label", code)
-                output += f"* **{label}:**\n"
-                for inst in instances:
-                    emoji_status = status_map.get(inst['status'], "❓")
-                    output += f"  - {emoji_status} *{inst['q']}*\n"
-                    if inst['status'] != "fixed":
-                        output += f"    - Hint: {inst['comment']}\n"
-        output += "\n"
-    
-    # --- CRITERION 2: Morfosintaxi ---
-    c2_audit = audit_data["audit"].get("C2", {})
-    # Only show header if there is at least one subcategory with items
-    if any(instances for instances in c2_audit.values()):
-        output += "###### **Morfosintaxi i ortografia**\n"
-        for code, instances in c2_audit.items():
-            if instances: # Only show subcategory if it has items
-                label = GRADING_CONFIG["C2"]["rules"].get(code, {}).get("label", code)
-                output += f"* **{label}:**\n"
-                for inst in instances:
-                    emoji_status = status_map.get(inst['status'], "❓")
-                    output += f"  - {emoji_status} *{inst['q']}*\n"
-                    if inst['status'] != "fixed":
-                        output += f"    - Hint: {inst['comment']}\n"
-        output += "\n"
-
-    # --- NEW ERRORS SECTION ---
-    if audit_data.get("new_errors") and len(audit_data["new_errors"]) > 0:
-        output += "---\n###### **⚠️ New Errors Introduced**\n"
-        output += "Be careful! The following mistakes were not in your first draft:\n"
-        for err in audit_data["new_errors"]:
-            output += f"* *{err['q']}*: {err['r']}\n"
-
-    return output
-
-REVISION_COACH_PROMPT = """
-### ROLE: REVISION AUDITOR
-You are a British English Examiner verifying improvements in a second draft.
-
-### INPUT DATA PROVIDED:
-1. ORIGINAL DRAFT
-2. ORIGINAL ERRORS (JSON)
-3. NEW REVISED DRAFT
-
-### TASK:
-Compare the NEW VERSION against the ORIGINAL ERRORS. Categorize every error from the original JSON into one of these statuses:
-- `fixed`: The error is completely gone and the new phrasing is natural.
-- `still_present`: The student did not change this error.
-- `incorrectly_fixed`: The student changed the text, but it is still grammatically wrong (different error).
-
-### RULES:
-- **NO ANSWERS**: If an error is `still_present` or `incorrectly_fixed`, do NOT give the correction.
-- Catch NEW errors: If the student introduced a brand new error not present in the first draft, add it to a `new_errors` list.
-
-### OUTPUT JSON STRUCTURE:
-{
-  "audit": {
-    "C1": { "category_code": [{"q": "original_quote", "status": "fixed/still_present/incorrectly_fixed", "comment": "Brief hint"}] },
-    "C2": { "category_code": [{"q": "original_quote", "status": "fixed/still_present/incorrectly_fixed", "comment": "Brief hint"}] }
-  },
-  "new_errors": [{"q": "new_quote", "r": "rule"}],
-  "VOC_CHANGE": "State if vocabulary improved, stayed same, or worsened",
-  "OVERALL": "Brief summary of the effort made in this revision."
-}
-"""
+# 2. GRADING CONFIGURATION, PROMPTS AND SCORING: see grading.py
 
 # 3. SESSION STATE
 if 'essay_content' not in st.session_state:
@@ -267,60 +41,130 @@ if 'fb2' not in st.session_state:
     st.session_state.fb2 = ""
 if 'raw_response' not in st.session_state:
     st.session_state.raw_response = ""
+if 'draft1' not in st.session_state:
+    st.session_state.draft1 = ""
+if 'session_key' not in st.session_state:
+    st.session_state.session_key = ""
+if 'memo' not in st.session_state:
+    st.session_state.memo = {}
+
+def memo(name, source, build):
+    # Rebuilt only when its input changed since the previous rerun
+    cached = st.session_state.memo.get(name)
+    if cached is None or cached[0] != source:
+        cached = (source, build(source))
+        st.session_state.memo[name] = cached
+    return cached[1]
 
 # 4. AI CONNECTION
-def call_gemini_initial_feedback(prompt):
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent?key={API_KEY}"
-    headers = {'Content-Type': 'application/json'}
-    data = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.0,
-        }
-    }
-    try:
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-            raw_text = response.json()['candidates'][0]['content']['parts'][0]['text']
-            
-            # Remove Markdown code blocks if the AI included them
-            clean_json = re.sub(r'^```json\s*|```$', '', raw_text, flags=re.MULTILINE).strip()
-            return clean_json
-        
-        elif response.status_code == 429:
-            return "The teacher is busy (Rate limit). Try again in 10 seconds."
-            
-        return f"An unexpected error occurred: {response.status_code}"
-    
-    except Exception as e:
-        return f"Connection error: {str(e)}"
+@st.cache_resource
+def get_gemini_client():
+    # One client per process: every student session shares the same connection pool
+    # and the same admission queue, so a class-wide burst is spread out instead of
+    # bouncing off the rate limit
+    # With fallback backends configured, a 429 moves on to the next backend instead of retrying
+    fallbacks = st.secrets.get("MODEL_BACKENDS", [])
+    scheduler = RequestScheduler(
+        max_in_flight=int(st.secrets.get("GEMINI_MAX_IN_FLIGHT", 4)),
+        max_retries=int(st.secrets.get("GEMINI_MAX_RETRIES", 0 if fallbacks else 4)),
+        retry_exceptions=(requests.ConnectionError,),
+    )
+    primary = GeminiClient(
+        API_KEY,
+        model=st.secrets.get("GEMINI_MODEL", DEFAULT_MODEL),
+        base_url=st.secrets.get("GEMINI_BASE_URL", DEFAULT_BASE_URL),
+        connect_timeout=float(st.secrets.get("GEMINI_CONNECT_TIMEOUT", 5)),
+        read_timeout=float(st.secrets.get("GEMINI_READ_TIMEOUT", 90)),
+        scheduler=scheduler,
+        # Seconds the rubric stays registered as cached content (0 sends it inline every time)
+        context_cache_ttl=int(st.secrets.get("GEMINI_CONTEXT_CACHE_TTL", 3600)),
+    )
+    if not fallbacks:
+        return primary
+    # e.g. MODEL_BACKENDS = [{kind = "gemini", model = "gemini-2.5-flash-lite"},
+    #                        {kind = "openai", model = "llama3.1", base_url = "http://localhost:11434/v1"}]
+    return ModelRouter(
+        [primary] + [build_backend(dict(spec), API_KEY) for spec in fallbacks],
+        initial_hedge_delay=float(st.secrets.get("HEDGE_AFTER_SECONDS", 20)),
+    )
+
+@st.cache_resource
+def get_metrics():
+    # Spans from every session; optionally appended to a local JSONL trace
+    return Metrics(trace_path=st.secrets.get("METRICS_TRACE_PATH"))
+
+@contextlib.contextmanager
+def queue_notice():
+    # Yields the on_queue callback: the student's place in the admission queue while a call waits
+    queue_status = st.empty()
+
+    def show_queue_position(position):
+        queue_status.info(f"⏳ Many students are submitting right now. You are number {position} in the queue...")
 
-# 4. AI CONNECTION
-def call_gemini_second_feedback(prompt):
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent?key={API_KEY}"
-    headers = {'Content-Type': 'application/json'}
-    data = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.0,
-        }
-    }
     try:
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-            raw_text = response.json()['candidates'][0]['content']['parts'][0]['text']
-            
-            # Remove Markdown code blocks if the AI included them
-            clean_json = re.sub(r'^```json\s*|```$', '', raw_text, flags=re.MULTILINE).strip()
-            return clean_json
-        
-        elif response.status_code == 429:
-            return "The teacher is busy (Rate limit). Try again in 10 seconds."
-            
-        return f"An unexpected error occurred: {response.status_code}"
-    
-    except Exception as e:
-        return f"Connection error: {str(e)}"
+        yield show_queue_position
+    finally:
+        queue_status.empty()
+
+def progressive_renderer(screen, task):
+    # Renders each criterion through the normal feedback formatting as soon as it is parsed
+    # Best effort: a malformed member stops the preview, and the full answer still goes
+    # through parse_json_response and the repair re-ask
+    area = st.empty()
+    parser = TopLevelObjectParser()
+    broken = []
+
+    def on_text(fragment):
+        if broken:
+            return
+        try:
+            if parser.feed(fragment):
+                area.markdown(format_partial_feedback(screen.merge(parser.members), task.config))
+        except (ValueError, KeyError, TypeError) as e:
+            broken.append(e)
+            area.empty()
+    return on_text
+
+@st.cache_resource
+def get_grading_cache():
+    # Grading runs at temperature 0.0, so identical inputs can reuse the parsed result
+    return GradingCache(
+        st.secrets.get("GRADING_CACHE_PATH", "grading_cache.sqlite3"),
+        max_entries=int(st.secrets.get("GRADING_CACHE_MAX_ENTRIES", 5000)),
+        ttl_seconds=float(st.secrets.get("GRADING_CACHE_TTL_DAYS", 30)) * 24 * 3600,
+    )
+
+@st.cache_resource
+def get_sheet_outbox():
+    # Log rows are written locally first and posted to the Sheet in the background
+    return SheetOutbox(
+        SHEET_URL,
+        path=st.secrets.get("SHEET_OUTBOX_PATH", "sheet_outbox.sqlite3"),
+        batch_size=int(st.secrets.get("SHEET_BATCH_SIZE", 1)),
+        metrics=get_metrics(),
+    )
+
+@st.cache_resource
+def get_session_store():
+    # Progress is saved per group + students, so a refresh or a later visit restores it
+    return SessionStore(
+        st.secrets.get("SESSION_STORE_PATH", "sessions.sqlite3"),
+        ttl_seconds=float(st.secrets.get("SESSION_TTL_DAYS", 14)) * 24 * 3600,
+    )
+
+@st.cache_resource
+def get_task_registry():
+    # One registry per process; each task is compiled on first use and reloaded when its file changes
+    return TaskRegistry(st.secrets.get("TASKS_DIR", "tasks"))
+
+@st.cache_resource
+def get_results_store():
+    # Per-code counts and scores of every submission, for the teacher view
+    return ResultsStore(st.secrets.get("RESULTS_STORE_PATH", "results.sqlite3"))
+
+def save_session():
+    if st.session_state.session_key:
+        get_session_store().save(st.session_state.session_key, group, student_list, st.session_state)
 
 # 5. UI CONFIGURATION
 st.set_page_config(page_title="Writing Test", layout="centered", initial_sidebar_state="expanded")
@@ -339,6 +183,26 @@ st.markdown("""
 
 st.title("📝 Writing")
 
+# The assignment comes from the link the teacher shares: ...?task=<task file name>
+task_id = st.query_params.get("task", st.secrets.get("DEFAULT_TASK", "default"))
+try:
+    task = get_task_registry().get(task_id)
+except (OSError, ValueError) as e:
+    st.error(f"The task '{task_id}' could not be loaded: {e}")
+    st.stop()
+if task is None:
+    st.error(f"Unknown task '{task_id}'. Please check the link your teacher gave you.")
+    st.stop()
+
+# Class results for the teacher: ...?view=teacher
+if st.query_params.get("view") == "teacher":
+    teacher_password = st.secrets.get("TEACHER_PASSWORD")
+    if not teacher_password:
+        st.error("Set TEACHER_PASSWORD in the secrets to enable the teacher view.")
+    elif st.text_input("Teacher password", type="password") == teacher_password:
+        render_teacher_view(get_results_store(), get_task_registry().task_ids(), task.config)
+    st.stop()
+
 with st.sidebar:
     st.header("Student Info")
     group = st.selectbox("Group", [" ","3A", "3C", "4A", "4B", "4C"])
@@ -349,71 +213,84 @@ with st.sidebar:
     names = [s.strip() for s in [s1, s2, s3, s4] if s.strip()]
     student_list = ", ".join(names)
 
+    if ADMIN_METRICS:
+        with st.expander("📊 Latency per stage"):
+            st.dataframe(get_metrics().summary(), hide_index=True)
+            st.write("Tokens:", get_metrics().tokens())
+            st.write("Answered by:", get_metrics().tag_counts())
+            st.download_button("Prometheus metrics", get_metrics().prometheus_text(),
+                               file_name="metrics.prom", mime="text/plain")
+
+# Restore a team's saved feedback as soon as its group and names are filled in
+if group.strip() and names:
+    key = session_key(group, names, task.id)
+    if st.session_state.session_key != key:
+        st.session_state.session_key = key
+        saved = get_session_store().load(key)
+        if saved and saved["fb1"]:
+            st.session_state.update(saved)
+
 st.markdown(f"### 📋 Task Description")
-st.info(TASK_DESC)
+st.info(task.description)
 
 essay = st.text_area("Write your composition below:", value=st.session_state.essay_content, height=500)
 st.session_state.essay_content = essay
-word_count = len(essay.split())
+word_count = count_words(essay)
 st.caption(f"Word count: {word_count}")
+if LIVE_CHECKS and essay.strip():
+    # The text area reports its value when the student pauses (leaves the box or presses
+    # Ctrl+Enter); only paragraphs that changed since the last check are scanned again
+    st.markdown(memo(f"live:{task.id}", essay, lambda text: format_live_report(live_report(text, task), task)))
 
 # --- 1. FIRST FEEDBACK BUTTON ---
 if not st.session_state.fb1:
     if st.button("🔍 Get Feedback", use_container_width=True):
+        screen = PreScreen(essay)
         if not s1 or not essay:
             st.error("Please enter your name and write your composition first.")
-        elif word_count <= MIN_ESSAI_WORD_COUNT:
-            # Handle the too-short case immediately
-            fb = "Your composition is too short to be marked. FINAL MARK: 0/10"
-            st.session_state.fb1 = fb
-            requests.post(SHEET_URL, json={
-                "type": "FIRST", "Group": group, "Students": student_list, "Mark": "0/10",
-                "Draft 1": essay, "FB 1": fb, "Word Count": word_count
-            })
-            st.rerun()
+        elif screen.rejection:
+            # Empty, pasted or non-English text never reaches the model
+            st.warning(screen.rejection)
         else:
-            with st.spinner("Teacher is analyzing your text and computing the grade..."):
-                formatted_points = "\n".join([f"- {p}" for p in REQUIRED_CONTENT_POINTS])
-                full_prompt = f"{RUBRIC_INSTRUCTIONS}\n\nREQUIRED POINTS:\n{formatted_points}\n\nESSAY:\n{essay}"
-                
-                raw_response = call_gemini_initial_feedback(full_prompt)
-                st.session_state.raw_response = "" + raw_response
-                
-                # Logic to determine if we got valid JSON or an error message
-                if raw_response.strip().startswith("{"):
-                    try:
-                        # 1. Clean and Load JSON
-                        clean_json = re.sub(r'^```json\s*|```$', '', raw_response, flags=re.MULTILINE).strip()
-                        data = json.loads(clean_json)
-                        
-                        # 2. Compute scores using Python logic
-                        # scores returns: (c1_score, c2_score, c3_score, final_mark)
-                        scores = compute_mark(data, word_count)
-                        
-                        # 3. Format the beautiful output for the student
-                        st.session_state.fb1 = format_feedback(data, scores)
-                        
-                        # 4. Log to Google Sheets
-                        requests.post(SHEET_URL, json={
-                            "type": "FIRST", 
-                            "Group": group, 
-                            "Students": student_list, 
-                            "Task": TASK_DESC,
-                            "Mark": f"{str(scores[3]).replace('.', ',')}/10", 
-                            "Draft 1": essay,
-                            "FB 1": st.session_state.fb1, 
-                            "Word Count": word_count,
-                        })
-                        st.rerun()
-                        
-                    except Exception as e:
-                        st.error(f"Linguistic Analysis Error: The AI response was not in the expected format.")
-                        with st.expander("Debug Raw Response"):
-                            st.code(raw_response)
-                            st.write(f"Python Error: {e}")
-                else:
-                    # This handles the "Teacher is busy" or connection error strings
-                    st.error(raw_response)
+            trace = get_metrics().trace("first")
+
+            def record_first(data, scores, feedback):
+                # Session, results store and Sheet; data is None for a text too short to be marked
+                st.session_state.raw_response = json.dumps(data, ensure_ascii=False) if data else ""
+                st.session_state.fb1 = feedback
+                st.session_state.draft1 = essay
+                save_session()
+                with trace.span("results_log"):
+                    get_results_store().record_first(st.session_state.session_key, task.id, group,
+                                                     student_list, data, scores, word_count)
+                with trace.span("sheet_log"):
+                    get_sheet_outbox().enqueue({
+                        "type": "FIRST", 
+                        "Group": group, 
+                        "Students": student_list, 
+                        "Task": task.description,
+                        "Mark": f"{str(scores[3]).replace('.', ',')}/10", 
+                        "Draft 1": essay,
+                        "FB 1": feedback, 
+                        "Word Count": word_count,
+                    })
+
+            try:
+                with st.spinner("Teacher is analyzing your text and computing the grade..."), \
+                        queue_notice() as on_queue:
+                    # Pre-screen, cache lookup, model call, scoring and formatting: see grading.grade_essay
+                    grade_essay(essay, get_gemini_client(), get_grading_cache(), trace, task, screen=screen,
+                                on_text=progressive_renderer(screen, task) if STREAM_FEEDBACK else None,
+                                on_queue=on_queue, on_graded=record_first)
+                st.rerun()
+            except GeminiError as e:
+                # This handles the "Teacher is busy" or connection errors
+                st.error(str(e))
+            except ResponseFormatError as e:
+                st.error(f"Linguistic Analysis Error: The AI response was not in the expected format.")
+                with st.expander("Debug Raw Response"):
+                    st.code(e.raw)
+                    st.write(f"Python Error: {e}")
 
 # --- 2. DISPLAY FIRST FEEDBACK ---
 if st.session_state.fb1:
@@ -424,38 +301,42 @@ if st.session_state.fb1:
     
     if DEBUG: 
         st.json(st.session_state.raw_response)
+        st.write("Grading cache:", get_grading_cache().stats())
+        if get_gemini_client().context_cache:
+            st.write("Prompt cache:", get_gemini_client().context_cache.stats())
+        st.write("Sheet outbox:", get_sheet_outbox().stats())
+        if isinstance(get_gemini_client(), ModelRouter):
+            st.write("Model router:", get_gemini_client().stats())
+        st.write("Sessions:", get_session_store().stats())
 
 # --- 3. REVISION BUTTON ---
 if st.session_state.fb1 and not st.session_state.fb2:
     if st.button("🚀 Submit Final Revision", use_container_width=True):
-        with st.spinner("✨ Checking your improvements..."):
-            # We send the raw JSON and the draft
-            rev_prompt = (f"{REVISION_COACH_PROMPT}\n\n"
-                          f"ORIGINAL ERRORS (JSON):\n{st.session_state.raw_response}\n\n"
-                          f"NEW VERSION:\n{essay}")
-            
-            fb2_raw = call_gemini_second_feedback(rev_prompt)
-            
-            if fb2_raw.strip().startswith("{"):
-                try:
-                    # Clean and load
-                    clean_json = re.sub(r'^```json\s*|```$', '', fb2_raw, flags=re.MULTILINE).strip()
-                    audit_data = json.loads(clean_json)
-                    
-                    # Format for student
-                    st.session_state.fb2 = format_revision_feedback(audit_data)
-                    
-                    # Log to Sheet
-                    requests.post(SHEET_URL, json={
-                        "type": "REVISION", "Group": group, "Students": student_list,
-                        "Final Essay": essay, "FB 2": st.session_state.fb2, "Word Count": word_count
-                    })
-                    st.balloons()
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Error parsing revision: {e}")
-            else:
-                st.error(fb2_raw)
+        trace = get_metrics().trace("revision")
+
+        def record_revision(audit_data, feedback):
+            st.session_state.fb2 = feedback
+            save_session()
+            # Log to Sheet and the results store
+            with trace.span("results_log"):
+                get_results_store().record_revision(st.session_state.session_key, task.id, group,
+                                                    student_list, audit_data, word_count)
+            with trace.span("sheet_log"):
+                get_sheet_outbox().enqueue({
+                    "type": "REVISION", "Group": group, "Students": student_list,
+                    "Final Essay": essay, "FB 2": feedback, "Word Count": word_count
+                })
+
+        try:
+            with st.spinner("✨ Checking your improvements..."), queue_notice() as on_queue:
+                check_revision(st.session_state.raw_response, st.session_state.draft1, essay, get_gemini_client(),
+                               get_grading_cache(), trace, task, on_queue=on_queue, on_checked=record_revision)
+            st.balloons()
+            st.rerun()
+        except GeminiError as e:
+            st.error(str(e))
+        except ResponseFormatError as e:
+            st.error(f"Error parsing revision: {e}")
 
 # --- 4. FINAL FEEDBACK ---
 if st.session_state.fb2:
@@ -0,0 +1,216 @@
+"""Grade a whole set of essays outside the Streamlit app.
+
+    python batch_grade.py essays.csv marks.csv --workers 8 --rate 120
+    python batch_grade.py marks.csv remarked.csv --rescore --config new_rubric.json
+    python batch_grade.py essays.csv marks.csv --task tasks/end_of_year_trip.yaml
+
+Input is CSV or JSONL with an essay column (default "essay") and an optional id
+column (default "id", otherwise the row number). Every graded essay is appended
+to a checkpoint file, so an interrupted run picks up where it stopped.
+
+--rescore takes a previous output file instead and re-marks the stored model
+results with the current (or --config) rubric, without any model calls.
+
+--task grades against a task file (content points, word limits, scoring
+tables) instead of the built-in assignment; --config still overrides its rubric.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from gemini_client import DEFAULT_BASE_URL, DEFAULT_MODEL, GeminiClient, GeminiError
+from grading import (DEFAULT_TASK, FULL_MARK_WORD_COUNT, GRADING_CONFIG, count_words, format_feedback,
+                     grade_essay, merge_grading_config)
+from grading_cache import GradingCache
+from scheduler import RequestScheduler
+from scoring import ScoringEngine
+from tasks import load_task
+
+OUTPUT_FIELDS = ["id", "word_count", "C1", "C2", "C3", "mark", "feedback", "result", "error"]
+
+
+class RateLimiter:
+    # Spaces request starts evenly so the batch stays under `per_minute`
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+def read_essays(path, essay_column="essay", id_column="id"):
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+    return [(str(row.get(id_column) or i), row[essay_column]) for i, row in enumerate(rows, 1)]
+
+
+def load_checkpoint(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    # Failed essays are retried on the next run
+                    if not record["error"]:
+                        done[record["id"]] = record
+    return done
+
+
+def grade_one(essay_id, essay, client, cache, limiter, task=DEFAULT_TASK):
+    record = {"id": essay_id, "word_count": count_words(essay), "error": ""}
+    try:
+        limiter.wait()
+        data, scores, feedback = grade_essay(essay, client, cache, task=task)
+        record.update({"C1": scores[0], "C2": scores[1], "C3": scores[2], "mark": scores[3],
+                       "feedback": feedback, "result": data})
+    except (GeminiError, ValueError, KeyError, TypeError) as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def read_results(path):
+    # Reads a previous output file back, with the model result decoded
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    with open(path, encoding="utf-8", newline="") as f:
+        records = list(csv.DictReader(f))
+    for record in records:
+        record["result"] = json.loads(record["result"]) if record.get("result") else None
+    return records
+
+
+def rescore(records, config=GRADING_CONFIG, log=sys.stderr, full_mark_word_count=FULL_MARK_WORD_COUNT):
+    started = time.monotonic()
+    engine = ScoringEngine(config, full_mark_word_count)
+    graded = [r for r in records if r.get("result")]
+    marks = engine.score_batch([r["result"] for r in graded], [int(r["word_count"]) for r in graded])
+    for i, record in enumerate(graded):
+        scores = tuple(float(marks[name][i]) for name in ("C1", "C2", "C3", "total"))
+        record.update({"C1": scores[0], "C2": scores[1], "C3": scores[2], "mark": scores[3],
+                       "feedback": format_feedback(record["result"], scores, config)})
+    print(f"Re-scored {len(graded)} results in {time.monotonic() - started:.2f}s", file=log)
+    return records
+
+
+def write_output(path, records):
+    if path.endswith(".jsonl"):
+        with open(path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+        writer.writeheader()
+        for record in records:
+            row = dict(record)
+            row["result"] = json.dumps(row.get("result"), ensure_ascii=False)
+            writer.writerow({k: row.get(k, "") for k in OUTPUT_FIELDS})
+
+
+def run_batch(essays, client, checkpoint_path, workers=4, per_minute=0, cache=None, log=sys.stderr,
+              task=DEFAULT_TASK):
+    done = load_checkpoint(checkpoint_path)
+    pending = [(i, e) for i, e in essays if i not in done]
+    print(f"{len(essays)} essays, {len(essays) - len(pending)} already graded, {len(pending)} to go",
+          file=log)
+
+    limiter = RateLimiter(per_minute)
+    started = time.monotonic()
+    graded = 0
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(grade_one, i, e, client, cache, limiter, task) for i, e in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            checkpoint.write(json.dumps(record, ensure_ascii=False) + "\n")
+            checkpoint.flush()
+            done[record["id"]] = record
+            graded += 1
+            rate = 60 * graded / max(time.monotonic() - started, 1e-9)
+            status = "ERROR " + record["error"] if record["error"] else f"mark {record['mark']}"
+            print(f"[{graded}/{len(pending)}] {record['id']}: {status} ({rate:.1f} essays/min)", file=log)
+
+    elapsed = time.monotonic() - started
+    if graded:
+        print(f"Graded {graded} essays in {elapsed:.1f}s ({60 * graded / elapsed:.1f} essays/min)", file=log)
+    return [done[i] for i, _ in essays if i in done]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-grade essays with the writing rubric.")
+    parser.add_argument("input", help="CSV or JSONL file with the essays")
+    parser.add_argument("output", help="CSV or JSONL file for marks and feedback")
+    parser.add_argument("--essay-column", default="essay")
+    parser.add_argument("--id-column", default="id")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent model requests")
+    parser.add_argument("--rate", type=float, default=0, help="max requests per minute (0 = no limit)")
+    parser.add_argument("--checkpoint", help="progress file (default: OUTPUT.checkpoint.jsonl)")
+    parser.add_argument("--cache", default="grading_cache.sqlite3", help="grading cache ('' to disable)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--rescore", action="store_true", help="re-mark a previous output file offline")
+    parser.add_argument("--config", help="JSON file with GRADING_CONFIG overrides (scores, penalties, labels)")
+    parser.add_argument("--task", help="JSON/YAML task file (default: the built-in assignment)")
+    args = parser.parse_args(argv)
+
+    task = DEFAULT_TASK
+    if args.task:
+        task = load_task(os.path.splitext(os.path.basename(args.task))[0], args.task)
+    config = task.config
+    if args.config:
+        # Overrides on top of the task's rubric, validated like a task file's grading section:
+        # a config copied from an older GRADING_CONFIG keeps the connector rule
+        try:
+            with open(args.config, encoding="utf-8") as f:
+                config = merge_grading_config(json.load(f), task.config)
+        except ValueError as e:
+            parser.error(f"{args.config}: {e}")
+
+    if args.rescore:
+        records = rescore(read_results(args.input), config, full_mark_word_count=task.full_mark_word_count)
+        write_output(args.output, records)
+        return 0
+
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        parser.error("set GEMINI_API_KEY in the environment")
+
+    scheduler = RequestScheduler(max_in_flight=args.workers, retry_exceptions=(requests.ConnectionError,))
+    client = GeminiClient(api_key, model=args.model, base_url=args.base_url,
+                          pool_size=args.workers, scheduler=scheduler)
+    cache = GradingCache(args.cache) if args.cache else None
+    essays = read_essays(args.input, args.essay_column, args.id_column)
+
+    records = run_batch(essays, client, args.checkpoint or args.output + ".checkpoint.jsonl",
+                        workers=args.workers, per_minute=args.rate, cache=cache, task=task)
+    if args.config:
+        records = rescore(records, config, full_mark_word_count=task.full_mark_word_count)
+    write_output(args.output, records)
+    failed = sum(1 for r in records if r["error"])
+    print(f"Wrote {len(records)} results to {args.output} ({failed} failed)", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Cost of the local pre-screen per essay, in microseconds.
+
+    python bench_prescreen.py [n_essays]
+"""
+import random
+import sys
+import time
+
+from metrics import percentile
+from prescreen import PreScreen
+
+SENTENCES = [
+    "We are going to visit Rome and Florence next May.",
+    "First of all we will see the Colosseum, which is very old.",
+    "i think it will be the best trip of my life.",
+    "However, my sister is not coming because she has exams.",
+    "my parents are happy but they are a bit worried about the money.",
+    "In addition, we are going to do a cooking class and visit a museum.",
+    "Our teachers say that we must be at the hotel before eleven.",
+    "Finally we will take a boat to an island near Naples.",
+    "My best friend Marta is going to share the room with me and i am so excited.",
+    "Then we will go shopping, so I need to save some money.",
+    "Nevertheless, we will visit the Vatican when we have a free morning.",
+    "In fact, if it rains we will go to a museum instead.",
+    "Even though the hotel is small, it is near the centre; otherwise we would take a bus.",
+    "Meanwhile my brother is staying at home, nonetheless he is happy for me.",
+]
+
+
+def synthetic_essay(rng):
+    body = " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(8, 16)))
+    return f"Dear Liam,\n\nThanks for your email. {body}\n\nBest wishes,\nAna"
+
+
+def time_each(essays):
+    timings = []
+    for essay in essays:
+        started = time.perf_counter()
+        PreScreen(essay)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return timings
+
+
+def main(n):
+    rng = random.Random(7)
+    essays = [synthetic_essay(rng) for _ in range(n)]
+    degenerate = {
+        "empty": ["   \n "] * n,
+        "not English": ["Hola Liam, este año vamos a Roma con la clase y mis profesores. " * 4] * n,
+        "huge paste": ["lorem ipsum dolor sit amet " * 400] * n,
+    }
+
+    time_each(essays[:100])  # warm-up
+    timings = time_each(essays)
+    words = sum(len(e.split()) for e in essays) / n
+    print(f"{n} essays, {words:.0f} words on average")
+    print(f"full pre-screen: p50={percentile(timings, 50):.1f} us  p95={percentile(timings, 95):.1f} us  "
+          f"mean={sum(timings) / n:.1f} us")
+    for name, inputs in degenerate.items():
+        rejected = time_each(inputs)
+        assert PreScreen(inputs[0]).rejection
+        print(f"reject {name + ':':13} p50={percentile(rejected, 50):.1f} us")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
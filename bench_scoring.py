@@ -0,0 +1,54 @@
+"""Compare compute_mark with the vectorized ScoringEngine on synthetic results.
+
+    python bench_scoring.py [n_results]
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from grading import GRADING_CONFIG, compute_mark
+from scoring import ScoringEngine
+
+CONNECTORS = ["and", "but", "because", "however", "then", "also", "so", "firstly", "finally"]
+
+
+def synthetic_result(rng):
+    error = {"q": "quote", "r": "rule"}
+    data = {}
+    for criterion in ("C1", "C2"):
+        data[criterion] = {code: [error] * rng.choice([0, 0, 0, 1, 1, 2, 3])
+                           for code in GRADING_CONFIG[criterion]["rules"]}
+    data["C1"]["CONN"] = [rng.choice(CONNECTORS) for _ in range(rng.randint(0, 9))]
+    data["C3"] = {"VOC": rng.choice(["0.0", "1.0", "2.0"])}
+    data["OVERALL"] = {"IMP": "Synthetic result."}
+    return data
+
+
+def main(n):
+    rng = random.Random(42)
+    results = [synthetic_result(rng) for _ in range(n)]
+    word_counts = [rng.randint(66, 200) for _ in range(n)]
+
+    started = time.perf_counter()
+    expected = [compute_mark(d, w) for d, w in zip(results, word_counts)]
+    loop_seconds = time.perf_counter() - started
+
+    engine = ScoringEngine()
+    started = time.perf_counter()
+    marks = engine.score_batch(results, word_counts)
+    batch_seconds = time.perf_counter() - started
+
+    expected = np.array(expected)
+    for column, name in enumerate(("C1", "C2", "C3", "total")):
+        assert np.allclose(marks[name], expected[:, column]), f"{name} differs from compute_mark"
+
+    print(f"{n} results")
+    print(f"compute_mark loop:   {loop_seconds * 1000:8.1f} ms ({loop_seconds / n * 1e6:.1f} us/result)")
+    print(f"ScoringEngine batch: {batch_seconds * 1000:8.1f} ms ({batch_seconds / n * 1e6:.1f} us/result)")
+    print(f"speed-up: {loop_seconds / batch_seconds:.1f}x, marks identical")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
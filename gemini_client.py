@@ -0,0 +1,271 @@
+import contextlib
+import hashlib
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from stream_parser import chunk_text, sse_events
+
+# v1beta is where responseSchema (structured output) is available
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+
+class GeminiError(Exception):
+    # The message is shown to the student as-is
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+@contextlib.contextmanager
+def interrupted_stream(fragments):
+    # A stream that breaks after on_text has shown part of the answer is not retried:
+    # the retry would show that part twice. GeminiError is never in retry_exceptions.
+    try:
+        yield
+    except requests.RequestException as e:
+        if fragments:
+            raise GeminiError(f"The connection broke while the teacher was answering. Please try again. ({e})")
+        raise
+
+
+class ContextCache:
+    """Static prompt prefixes (the rubric) registered once as Gemini cached content.
+
+    Entries are keyed by a hash of the model and the prefix text, so editing
+    the rubric registers a new cache, and they are re-created shortly before
+    their TTL runs out. Prefixes below the API's minimum size, or that the API
+    refuses, are sent as a plain systemInstruction instead.
+    """
+
+    def __init__(self, client, ttl_seconds=3600, min_chars=3000, refresh_margin=60):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.min_chars = min_chars
+        self.refresh_margin = refresh_margin
+        self.hits = 0
+        self.created = 0
+        self.fallbacks = 0
+        self._entries = {}
+        self._refused = {}
+        self._creating = set()
+        self._lock = threading.Lock()
+
+    def _key(self, system):
+        return hashlib.sha256(f"{self.client.model}\n{system}".encode("utf-8")).hexdigest()
+
+    def lookup(self, system):
+        # Returns the cachedContent name to use, or None to send systemInstruction
+        if len(system) < self.min_chars:
+            return None
+        key = self._key(system)
+        with self._lock:
+            now = time.time()
+            entry = self._entries.get(key)
+            if entry and entry[1] - self.refresh_margin > now:
+                self.hits += 1
+                return entry[0]
+            if self._refused.get(key, 0) > now:
+                self.fallbacks += 1
+                return None
+            if key in self._creating:
+                # Someone else is registering it: keep using the old entry until it
+                # expires, otherwise send this request inline instead of waiting
+                if entry and entry[1] > now:
+                    self.hits += 1
+                    return entry[0]
+                self.fallbacks += 1
+                return None
+            self._creating.add(key)
+        # The POST runs outside the lock, so only the request that registers the prefix waits for it
+        try:
+            name = self._create(system)
+        finally:
+            with self._lock:
+                self._creating.discard(key)
+        with self._lock:
+            if name is None:
+                self._refused[key] = now + self.ttl_seconds
+                self.fallbacks += 1
+                return None
+            self._entries[key] = (name, now + self.ttl_seconds)
+            self.created += 1
+            return name
+
+    def _create(self, system):
+        payload = {
+            "model": f"models/{self.client.model}",
+            "systemInstruction": {"parts": [{"text": system}]},
+            "ttl": f"{int(self.ttl_seconds)}s",
+        }
+        try:
+            response = self.client.session.post(f"{self.client.base_url}/cachedContents",
+                                                params={"key": self.client.api_key},
+                                                json=payload, timeout=self.client.timeout)
+            if response.status_code == 200:
+                return response.json()["name"]
+        except (requests.RequestException, ValueError, KeyError):
+            pass
+        return None
+
+    def invalidate(self, system):
+        with self._lock:
+            self._entries.pop(self._key(system), None)
+
+    def stats(self):
+        return {"hits": self.hits, "created": self.created, "fallbacks": self.fallbacks,
+                "live_entries": len(self._entries)}
+
+
+class GeminiClient:
+    """One pooled HTTP session to the Gemini API, shared by every student session."""
+
+    def __init__(self, api_key, model=DEFAULT_MODEL, base_url=DEFAULT_BASE_URL,
+                 connect_timeout=5.0, read_timeout=90.0, pool_size=32, scheduler=None,
+                 context_cache_ttl=3600):
+        self.api_key = api_key
+        self.scheduler = scheduler
+        self.model = model
+        self.name = f"gemini:{model}"
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.context_cache = ContextCache(self, context_cache_ttl) if context_cache_ttl else None
+
+        # Keep-alive connections are reused across submissions instead of a
+        # fresh TCP+TLS handshake per click
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+    def _url(self, method):
+        return f"{self.base_url}/models/{self.model}:{method}"
+
+    def post(self, method, payload, stream=False):
+        params = {"key": self.api_key}
+        if stream:
+            params["alt"] = "sse"
+        return self.session.post(self._url(method), params=params, json=payload,
+                                 timeout=self.timeout, stream=stream)
+
+    def send(self, method, payload, on_queue=None, attempt=None):
+        # `attempt` overrides a plain POST, e.g. to consume a stream while holding the slot
+        attempt = attempt or (lambda: self.post(method, payload))
+        if self.scheduler is None:
+            return attempt()
+        return self.scheduler.run(self.api_key, attempt, on_queue)
+
+    def _payload(self, prompt, temperature, response_schema=None, system=None, use_cache=True):
+        data = {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": {
+                "temperature": temperature,
+            }
+        }
+        if response_schema:
+            data["generationConfig"]["responseMimeType"] = "application/json"
+            data["generationConfig"]["responseSchema"] = response_schema
+        if system:
+            cached = self.context_cache.lookup(system) if use_cache and self.context_cache else None
+            if cached:
+                data["cachedContent"] = cached
+            else:
+                data["systemInstruction"] = {"parts": [{"text": system}]}
+        return data
+
+    def _checked(self, send):
+        try:
+            response = send()
+        except requests.Timeout:
+            raise GeminiError("The teacher took too long to answer. Please try again.")
+        except requests.RequestException as e:
+            raise GeminiError(f"Connection error: {str(e)}")
+
+        if response.status_code == 429:
+            raise GeminiError("The teacher is very busy right now (Rate limit). Please try again in a minute.",
+                              response.status_code)
+        if response.status_code != 200:
+            raise GeminiError(f"An unexpected error occurred: {response.status_code}", response.status_code)
+        return response
+
+    def _request(self, method, prompt, temperature, response_schema, system, on_queue, consume=None,
+                 before_send=None):
+        # before_send() runs once a slot is granted, before every HTTP attempt; it may raise to abandon the call
+        data = self._payload(prompt, temperature, response_schema, system)
+
+        def attempt():
+            if before_send:
+                before_send()
+            response = self.post(method, data, stream=consume is not None)
+            if consume and response.status_code == 200:
+                consume(response)
+            elif consume:
+                # Only the status is read; give the streamed connection back before a retry
+                response.close()
+            return response
+
+        try:
+            return self._checked(lambda: self.send(method, data, on_queue, attempt))
+        except GeminiError as e:
+            # The cached prefix expired or was deleted server-side: resend it inline once
+            if "cachedContent" not in data or e.status not in (400, 403, 404):
+                raise
+            self.context_cache.invalidate(system)
+            data = self._payload(prompt, temperature, response_schema, system, use_cache=False)
+            return self._checked(lambda: self.send(method, data, on_queue, attempt))
+
+    def generate(self, prompt, temperature=0.0, on_queue=None, response_schema=None, system=None,
+                 on_usage=None, on_backend=None, before_send=None):
+        # `system` is the static part of the prompt (rubric), sent as cached content
+        # or systemInstruction; `prompt` is the per-student part.
+        # on_usage(usageMetadata) receives the token counts of the call,
+        # on_backend(name) the name of the backend that answered.
+        response = self._request("generateContent", prompt, temperature, response_schema, system, on_queue,
+                                 before_send=before_send)
+
+        try:
+            body = response.json()
+            raw_text = body['candidates'][0]['content']['parts'][0]['text']
+        except (ValueError, KeyError, IndexError):
+            raise GeminiError("The teacher returned an empty answer. Please try again.")
+        if on_usage and "usageMetadata" in body:
+            on_usage(body["usageMetadata"])
+        if on_backend:
+            on_backend(self.name)
+        return raw_text
+
+    def generate_stream(self, prompt, on_text, temperature=0.0, on_queue=None, response_schema=None,
+                        system=None, on_usage=None, on_backend=None, before_send=None):
+        # Calls on_text(fragment) as the answer arrives; returns the full text
+        fragments = []
+        usage = {}
+
+        def consume(response):
+            # Each scheduler attempt starts from an empty answer
+            fragments.clear()
+            usage.clear()
+            with interrupted_stream(fragments):
+                for chunk in sse_events(response.iter_lines(decode_unicode=True)):
+                    # Every chunk carries the running usage; the last one is the total
+                    usage.update(chunk.get("usageMetadata", {}))
+                    fragment = chunk_text(chunk)
+                    if fragment:
+                        fragments.append(fragment)
+                        on_text(fragment)
+
+        self._request("streamGenerateContent", prompt, temperature, response_schema, system, on_queue,
+                      consume, before_send)
+        if not fragments:
+            raise GeminiError("The teacher returned an empty answer. Please try again.")
+        if on_usage and usage:
+            on_usage(usage)
+        if on_backend:
+            on_backend(self.name)
+        return "".join(fragments)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,591 @@
+import copy
+import json
+
+from grading_cache import grading_cache_key
+from metrics import NULL_TRACE
+from prescreen import PreScreen
+from response_schema import ResponseFormatError, compile_schema, parse_json_response
+from revision_diff import RevisionPlan
+
+# GRADING CONFIGURATION
+MIN_ESSAI_WORD_COUNT = 65
+# Essays shorter than this get their total halved
+FULL_MARK_WORD_COUNT = 80
+GRADING_CONFIG = {
+    "C1": {
+        "start_score": 4.0,
+        "rules": {
+            "MPoPOC": {"penalty": 0.5, "type": "once", "label": "Organization/Paragraphs"},
+            "WRF": {"penalty": 0.5, "type": "once", "label": "Register/Format"},
+            "WG": {"penalty": 1.0, "type": "once", "label": "Genre Accuracy"},
+            "MCP": {"penalty": 0.5, "type": "list", "label": "Content Points"},
+            "CS": {"penalty": 0.2, "type": "list", "label": "Comma Splices"},
+            "IC": {"penalty": 0.2, "type": "list", "label": "Introductory Commas"},
+            "GP": {"penalty": 0.3, "type": "list", "label": "General Punctuation"},
+        },
+        # Too few connectors, or too little variety, costs a flat penalty
+        "connectors": {"min_total": 5, "min_distinct": 3, "penalty": 1.0},
+    },
+    "C2": {
+        "start_score": 4.0,
+        "rules": {
+            "SpCap": {"penalty": 0.2, "type": "list", "label": "Spelling/Caps"},
+            "WWO": {"penalty": 0.3, "type": "list", "label": "Word Order"},
+            "VTF": {"penalty": 0.3, "type": "list", "label": "Verb Tense/Form"},
+            "SVA": {"penalty": 0.5, "type": "list", "label": "Subject-Verb Agreement"},
+            "ART": {"penalty": 0.3, "type": "list", "label": "Articles"},
+            "PREP": {"penalty": 0.2, "type": "list", "label": "Prepositions"},
+            "PRO": {"penalty": 0.3, "type": "list", "label": "Pronouns"},
+            "COLL": {"penalty": 0.1, "type": "list", "label": "Collocations"},
+            "SI": {"penalty": 0.5, "type": "once", "label": "Small 'i' usage"},
+            "CSU": {"penalty": 0.3, "type": "list", "label": "Comparatives/Superlatives"},
+        }
+    }
+}
+
+# --- TASK CONFIGURATION ---
+TASK_DESC = "This is your last year at school and you are planning your end of year trip together with your classmates and teachers. Write an email to Liam, your exchange partner from last year, who has just sent you an email. Tell him about your plans for the trip: the places you are going to visit, the activities you are going to do there, and also about your classmates, friends and family."
+
+REQUIRED_CONTENT_POINTS = [
+    "Plans for the trip",
+    "Places you are going to visit",
+    "Activities you are going to do",
+    "Information about classmates, friends, and family"
+]
+
+# 2. THE STERN TEACHER PROMPT
+RUBRIC_INSTRUCTIONS = """
+### ROLE: LINGUISTIC ANALYST (STRICT EXAMINER)
+You are a meticulous British English Examiner. The level of your students is B2 in CEFR. Your task is to analyze the student's text and categorize every error found into a specific JSON structure.
+
+### RULES:
+1. **NO ANSWERS**: Never provide the corrected version of an error. 
+2. **EXHAUSTIVE**: You must catch and categorize every single mistake.
+3. **ONLY JSON**: Your entire output must be a single, valid JSON object.
+4. **NO CEFR MENTION**: Never use "B2" or "CEFR" in the feedback.
+5. **LOCAL CODES**: `SI` is filled in by a separate program. Always return it as an empty list `[]`.
+6. **PUNCTUATION HINTS**: The prompt may list possible `GP` and `IC` errors found by a program. It is often wrong: check each one and report it under its code only if it really is an error.
+
+### ERROR CATEGORIZATION LOGIC:
+You must distinguish between **Global Issues** (listed once) and **Specific Occurrences** (list every instance).
+
+### KEY DEFINITIONS (Use these codes):
+#### Criterion 1 (Adequació):
+- `MPoPOC`: Missing Paragraphs or poorly organized content.
+- `WRF`: Wrong Register/Format (e.g., formal vs informal).
+- `WG`: Wrong Genre (e.g., writing a story instead of an email).
+- `MCP`: Missing Content Points (From the list provided).
+- `CS`: Comma Splices (Joining two sentences with only a comma).
+- `IC`: Missing Introductory Commas (After "First of all", "Yesterday", etc.).
+- `GP`: General Punctuation (Missing full stops, capital letters at start of sentences).
+- `CONN`: List of every connector used (e.g., "but", "however", "firstly").
+
+#### Criterion 2 (Morfosintaxi):
+- `SpCap`: Spelling or Capitalization errors (except counted in `GP`)
+- `WWO`: Wrong Word Order. (examples of wrong: "We will miss each so much other", "I always am happy")
+- `VTF`: Verb Tense or Verb Form errors. (examples of wrong verb tense: "we went to Italy tomorrow", "I have played football yesterday")
+- `SVA`: Subject-Verb Agreement. (examples of wrong: "she play football", "Has I been here before?", "She are playing")
+- `ART`: Missing or wrong Articles (a, an, the). (examples of wrong: "an hotel", "I like sea", "I live on an island. An island is beautiful.")
+- `PREP`: Wrong Prepositions.
+- `PRO`: Pronoun errors. (examples of wrong: "me and my friends study English", "This book is for they", "this book is my")
+- `COLL`: Lexical Collocations (words that don't sound natural together). (example of wrong: "take dinner", "make exam", "do the bed", "make a photo")
+- `SI`: Use of lowercase 'i' instead of uppercase 'I'.
+- `CSU`: Comparative or Superlative errors.
+
+#### Criterion 3 (Lèxic):
+- `VOC`: Vocabulary level (Must be "2.0", "1.0", or "0.0"). Depending on this criterion:
+    - 2.0 (Rich): High variety of vocabulary, sophisticated phrasing, and appropriate use of idioms or advanced words.
+    - 1.0 (Limited): Repetitive vocabulary, basic word choices, but sufficient for the task.
+    - 0.0 (Poor): Very basic or incorrect vocabulary that hinders communication.
+
+### JSON FORMATTING:
+- Every value except `CONN`, `VOC`, and `IMP` must be a LIST of OBJECTS: `{"q": "quote", "r": "rule"}`. quote must be the specific quote of the text and rule is the explain the grammar rule behind it. If it's a spelling mistake just say something like: check the spelling this word.
+- If no error is found in this category, return an empty list `[]`.
+
+### OUTPUT STRUCTURE:
+{
+  "C1": {
+    "MPoPOC": [], "WRF": [], "WG": [], "MCP": [], 
+    "CS": [], "IC": [], "GP": [], "CONN": []
+  },
+  "C2": {
+    "SpCap": [], "WWO": [], "VTF": [], 
+    "SVA": [],  "ART": [], "PREP": [], "PRO": [], "COLL": [], 
+    "SI": [], "CSU": []
+  },
+  "C3": {"VOC": "1.0"},
+  "OVERALL": {"IMP": "Brief general impression."}
+}
+"""
+
+CRITERION_TITLES = {
+    "C1": "Adequació, coherència i cohesió",
+    "C2": "Morfosintaxi i ortografia",
+}
+
+def score_criterion(criterion_data, criterion, config=GRADING_CONFIG):
+    score = config[criterion]["start_score"]
+    for key, rule in config[criterion]["rules"].items():
+        errors = criterion_data.get(key, [])
+        count = 1 if rule["type"] == "once" and errors else len(errors)
+        score -= (count * rule["penalty"])
+
+    # Connector Penalty logic
+    conn_rule = config[criterion].get("connectors")
+    if conn_rule:
+        conns = criterion_data.get("CONN", [])
+        if len(conns) < conn_rule["min_total"] or len(set(conns)) < conn_rule["min_distinct"]:
+            score -= conn_rule["penalty"]
+    return max(0, score)
+
+def compute_mark(data, word_count, config=GRADING_CONFIG, full_mark_word_count=FULL_MARK_WORD_COUNT):
+    c1_score = score_criterion(data["C1"], "C1", config)
+    c2_score = score_criterion(data["C2"], "C2", config)
+
+    # C3
+    c3_score = float(data["C3"].get("VOC", 1.0))
+
+    total = c1_score + c2_score + c3_score
+    if word_count < full_mark_word_count:
+        total = total / 2
+        
+    return round(c1_score, 2), round(c2_score, 2), c3_score, round(total, 2)
+
+def format_overall(data):
+    return f"\n**Overall Impression:** {data['OVERALL']['IMP']}\n\n---\n"
+
+def format_criterion(criterion_data, criterion, score, config=GRADING_CONFIG):
+    output = f"###### **{CRITERION_TITLES[criterion]} (Score: {str(score).replace('.', ',')}/4)**\n"
+    for key, rule in config[criterion]["rules"].items():
+        errors = criterion_data.get(key, [])
+        if errors:
+            output += f"* **{rule['label']}:**\n"
+            for e in errors:
+                output += f"  - *{e['q']}*: {e['r']}\n" if isinstance(e, dict) else f"  - {e}\n"
+    return output
+
+def format_lexis(c3_s):
+    return f"\n###### **Lèxic (Score: {str(c3_s).replace('.', ',')}/2)**\n"
+
+def format_final_mark(total):
+    output = f"\n---\n###### **FINAL MARK: {str(total).replace('.', ',')}/10**"
+    if total < 4.0: output += "\n\n⚠️ *Length penalty applied or significant errors found.*"
+    return output
+
+def format_feedback(data, scores, config=GRADING_CONFIG):
+    c1_s, c2_s, c3_s, total = scores
+    output = format_overall(data)
+    output += format_criterion(data["C1"], "C1", c1_s, config)
+    output += "\n" + format_criterion(data["C2"], "C2", c2_s, config)
+    output += format_lexis(c3_s)
+    output += format_final_mark(total)
+    return output
+
+def format_partial_feedback(sections, config=GRADING_CONFIG):
+    # Renders whatever top-level objects of the streamed answer have arrived so far
+    output = format_overall(sections) if "OVERALL" in sections else ""
+    if "C1" in sections:
+        score = round(score_criterion(sections["C1"], "C1", config), 2)
+        output += format_criterion(sections["C1"], "C1", score, config)
+    if "C2" in sections:
+        score = round(score_criterion(sections["C2"], "C2", config), 2)
+        output += "\n" + format_criterion(sections["C2"], "C2", score, config)
+    if "C3" in sections:
+        output += format_lexis(float(sections["C3"].get("VOC", 1.0)))
+    return output
+
+def format_revision_feedback(audit_data, config=GRADING_CONFIG):
+    status_map = {
+        "fixed": "✅ **Fixed:**",
+        "still_present": "❌ **Still present:**",
+        "incorrectly_fixed": "⚠️ **Incorrectly fixed:**"
+    }
+    
+    output = f"\n\n**Overall Revision Summary:** {audit_data['OVERALL']}\n\n"
+    output += f"**Vocabulary status:** {audit_data['VOC_CHANGE']}\n\n---\n"
+    
+    # --- CRITERION 1: Adequació ---
+    c1_audit = audit_data["audit"].get("C1", {})
+    # Only show header if there is at least one subcategory with items
+    if any(instances for instances in c1_audit.values()):
+        output += "###### **Adequació, coherència i cohesió**\n"
+        for code, instances in c1_audit.items():
+            if instances: # Only show the subcategory (e.g., Comma Splices) if it has items
+                label = config["C1"]["rules"].get(code, {}).get("label", code)
+                output += f"* **{label}:**\n"
+                for inst in instances:
+                    emoji_status = status_map.get(inst['status'], "❓")
+                    output += f"  - {emoji_status} *{inst['q']}*\n"
+                    if inst['status'] != "fixed":
+                        output += f"    - Hint: {inst['comment']}\n"
+        output += "\n"
+    
+    # --- CRITERION 2: Morfosintaxi ---
+    c2_audit = audit_data["audit"].get("C2", {})
+    # Only show header if there is at least one subcategory with items
+    if any(instances for instances in c2_audit.values()):
+        output += "###### **Morfosintaxi i ortografia**\n"
+        for code, instances in c2_audit.items():
+            if instances: # Only show subcategory if it has items
+                label = config["C2"]["rules"].get(code, {}).get("label", code)
+                output += f"* **{label}:**\n"
+                for inst in instances:
+                    emoji_status = status_map.get(inst['status'], "❓")
+                    output += f"  - {emoji_status} *{inst['q']}*\n"
+                    if inst['status'] != "fixed":
+                        output += f"    - Hint: {inst['comment']}\n"
+        output += "\n"
+
+    # --- NEW ERRORS SECTION ---
+    if audit_data.get("new_errors") and len(audit_data["new_errors"]) > 0:
+        output += "---\n###### **⚠️ New Errors Introduced**\n"
+        output += "Be careful! The following mistakes were not in your first draft:\n"
+        for err in audit_data["new_errors"]:
+            output += f"* *{err['q']}*: {err['r']}\n"
+
+    return output
+
+REVISION_COACH_PROMPT = """
+### ROLE: REVISION AUDITOR
+You are a British English Examiner verifying improvements in a second draft.
+
+### INPUT DATA PROVIDED:
+1. ERRORS TO CHECK (JSON): errors from the first draft whose quote no longer appears word for word in the new version. Errors that are still there word for word have already been marked and are not included.
+2. CHANGED PASSAGES: the sentences of the new version that were rewritten or added. The rest of the essay is identical to the first draft. (When a whole-essay issue must be checked, the FULL NEW VERSION is given instead.)
+
+### TASK:
+Compare the new text against the ERRORS TO CHECK. Categorize every error in that JSON into one of these statuses:
+- `fixed`: The error is completely gone and the new phrasing is natural. If the passage was deleted, the error is fixed.
+- `still_present`: The student did not change this error.
+- `incorrectly_fixed`: The student changed the text, but it is still grammatically wrong (different error).
+
+### RULES:
+- **NO ANSWERS**: If an error is `still_present` or `incorrectly_fixed`, do NOT give the correction.
+- Catch NEW errors: If the student introduced a brand new error in the new text, add it to a `new_errors` list.
+
+### OUTPUT JSON STRUCTURE:
+{
+  "audit": {
+    "C1": { "category_code": [{"q": "original_quote", "status": "fixed/still_present/incorrectly_fixed", "comment": "Brief hint"}] },
+    "C2": { "category_code": [{"q": "original_quote", "status": "fixed/still_present/incorrectly_fixed", "comment": "Brief hint"}] }
+  },
+  "new_errors": [{"q": "new_quote", "r": "rule"}],
+  "VOC_CHANGE": "State if vocabulary improved, stayed same, or worsened",
+  "OVERALL": "Brief summary of the effort made in this revision."
+}
+"""
+
+# RESPONSE SCHEMAS: sent to Gemini as responseSchema and used to validate the answer
+_ERROR_LIST = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"q": {"type": "STRING"}, "r": {"type": "STRING"}},
+        "required": ["q", "r"],
+    },
+}
+_AUDIT_LIST = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "q": {"type": "STRING"},
+            "status": {"type": "STRING", "enum": ["fixed", "still_present", "incorrectly_fixed"]},
+            "comment": {"type": "STRING"},
+        },
+        "required": ["q", "status", "comment"],
+    },
+}
+
+def _criterion_schema(criterion, item_schema, extra=None):
+    properties = {code: item_schema for code in GRADING_CONFIG[criterion]["rules"]}
+    properties.update(extra or {})
+    return {"type": "OBJECT", "properties": properties, "propertyOrdering": list(properties)}
+
+RUBRIC_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "C1": _criterion_schema("C1", _ERROR_LIST, {"CONN": {"type": "ARRAY", "items": {"type": "STRING"}}}),
+        "C2": _criterion_schema("C2", _ERROR_LIST),
+        "C3": {
+            "type": "OBJECT",
+            "properties": {"VOC": {"type": "STRING", "enum": ["2.0", "1.0", "0.0"]}},
+            "required": ["VOC"],
+        },
+        "OVERALL": {
+            "type": "OBJECT",
+            "properties": {"IMP": {"type": "STRING"}},
+            "required": ["IMP"],
+        },
+    },
+    "required": ["C1", "C2", "C3", "OVERALL"],
+    "propertyOrdering": ["C1", "C2", "C3", "OVERALL"],
+}
+
+REVISION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "audit": {
+            "type": "OBJECT",
+            "properties": {
+                "C1": _criterion_schema("C1", _AUDIT_LIST),
+                "C2": _criterion_schema("C2", _AUDIT_LIST),
+            },
+            "required": ["C1", "C2"],
+        },
+        "new_errors": _ERROR_LIST,
+        "VOC_CHANGE": {"type": "STRING"},
+        "OVERALL": {"type": "STRING"},
+    },
+    "required": ["audit", "VOC_CHANGE", "OVERALL"],
+    "propertyOrdering": ["audit", "new_errors", "VOC_CHANGE", "OVERALL"],
+}
+
+RESPONSE_SHAPES = {
+    "rubric": (RUBRIC_SCHEMA, compile_schema(RUBRIC_SCHEMA)),
+    "revision": (REVISION_SCHEMA, compile_schema(REVISION_SCHEMA)),
+}
+
+REPAIR_PROMPT = """
+Your previous answer could not be used: {problem}.
+Return the same analysis as a single valid JSON object with the required structure.
+Do not change the content of the analysis, only fix the format.
+
+PREVIOUS ANSWER:
+{raw}
+"""
+
+TOO_SHORT_FEEDBACK = "Your composition is too short to be marked. FINAL MARK: 0/10"
+
+
+# PIPELINE (no Streamlit here, so batch jobs can import it)
+def count_words(essay):
+    return len(essay.split())
+
+# The static part of each prompt goes in the system instruction, so it can be
+# cached once by the API; only the essay is sent with every request
+def build_initial_system(content_points=REQUIRED_CONTENT_POINTS):
+    formatted_points = "\n".join([f"- {p}" for p in content_points])
+    return f"{RUBRIC_INSTRUCTIONS}\n\nREQUIRED POINTS:\n{formatted_points}"
+
+def build_initial_prompt(essay, hints=None):
+    # hints: the pre-screen's possible GP/IC errors, for the model to confirm or drop
+    prompt = f"ESSAY:\n{essay}"
+    candidates = [{"code": code, "q": hint["q"]} for code, found in (hints or {}).items() for hint in found]
+    if candidates:
+        prompt += f"\n\nPOSSIBLE PUNCTUATION ERRORS (JSON):\n{json.dumps(candidates, ensure_ascii=False)}"
+    return prompt
+
+def build_revision_prompt(plan, essay):
+    # Only the errors that need a judgement and the text that changed
+    prompt = f"ERRORS TO CHECK (JSON):\n{json.dumps(plan.unresolved, ensure_ascii=False)}\n\n"
+    if plan.needs_full_text:
+        return prompt + f"FULL NEW VERSION:\n{essay}"
+    passages = "\n".join(f"- {p}" for p in plan.changed_passages) or "(none)"
+    return prompt + f"CHANGED PASSAGES:\n{passages}"
+
+def initial_cache_key(model, essay, content_points=REQUIRED_CONTENT_POINTS):
+    return grading_cache_key(model, RUBRIC_INSTRUCTIONS, content_points, essay)
+
+def revision_cache_key(model, original_errors, original_draft, essay, content_points=REQUIRED_CONTENT_POINTS):
+    # The first draft and its errors are part of the key: the same new draft audited
+    # against a different first result is a different question
+    return grading_cache_key(model, REVISION_COACH_PROMPT, content_points, original_errors,
+                             original_draft, essay)
+
+def generate_validated(client, prompt, shape="rubric", system=None, on_text=None, on_queue=None,
+                       trace=NULL_TRACE, on_backend=None):
+    # One model call plus, if the answer is malformed, one cheap repair re-ask that
+    # only resends the broken answer instead of the whole rubric and essay.
+    # on_backend(name) is told which backend answered each call.
+    def tagged(span):
+        def report(name):
+            span.tag("backend", name)
+            if on_backend:
+                on_backend(name)
+        return report
+
+    schema, validator = RESPONSE_SHAPES[shape]
+    with trace.span("model_call") as span:
+        if on_text:
+            raw = client.generate_stream(prompt, on_text, on_queue=on_queue, response_schema=schema,
+                                         system=system, on_usage=span.add_usage, on_backend=tagged(span))
+        else:
+            raw = client.generate(prompt, on_queue=on_queue, response_schema=schema, system=system,
+                                  on_usage=span.add_usage, on_backend=tagged(span))
+    try:
+        with trace.span("parse"):
+            return parse_json_response(raw, validator)
+    except ResponseFormatError as e:
+        repair_prompt = REPAIR_PROMPT.format(problem=e, raw=raw)
+        with trace.span("repair_call") as span:
+            repaired = client.generate(repair_prompt, on_queue=on_queue, response_schema=schema,
+                                       on_usage=span.add_usage, on_backend=tagged(span))
+        with trace.span("parse"):
+            return parse_json_response(repaired, validator)
+
+# TASKS
+def merge_grading_config(overrides, base=GRADING_CONFIG):
+    # A task file may change scores, penalties, labels and connector thresholds,
+    # but not the set of codes: those are fixed by the rubric prompt and schema
+    config = copy.deepcopy(base)
+    if not isinstance(overrides, dict):
+        raise ValueError("grading must be a mapping of criteria")
+    for criterion, changes in overrides.items():
+        if criterion not in config:
+            raise ValueError(f"unknown criterion {criterion!r}")
+        if not isinstance(changes, dict):
+            raise ValueError(f"grading.{criterion} must be a mapping")
+        for field, value in changes.items():
+            if field == "rules":
+                if not isinstance(value, dict):
+                    raise ValueError(f"grading.{criterion}.rules must be a mapping of codes")
+                for code, rule in value.items():
+                    if code not in config[criterion]["rules"]:
+                        raise ValueError(f"unknown {criterion} code {code!r}")
+                    if not isinstance(rule, dict):
+                        raise ValueError(f"grading.{criterion}.rules.{code} must be a mapping")
+                    config[criterion]["rules"][code].update(rule)
+            elif isinstance(value, dict):
+                config[criterion].setdefault(field, {}).update(value)
+            else:
+                config[criterion][field] = value
+    check_grading_config(config)
+    return config
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def check_grading_config(config):
+    # Catches a wrong value when the task is loaded, not in score_criterion after a paid model call
+    for criterion, section in config.items():
+        if not _is_number(section.get("start_score")):
+            raise ValueError(f"grading.{criterion}.start_score must be a number")
+        for code, rule in section["rules"].items():
+            if not _is_number(rule.get("penalty")):
+                raise ValueError(f"grading.{criterion}.rules.{code}.penalty must be a number")
+            if rule.get("type") not in ("once", "list"):
+                raise ValueError(f"grading.{criterion}.rules.{code}.type must be 'once' or 'list'")
+            if not isinstance(rule.get("label", ""), str):
+                raise ValueError(f"grading.{criterion}.rules.{code}.label must be text")
+        connectors = section.get("connectors")
+        if connectors is not None:
+            # null or missing turns the connector penalty off
+            if not isinstance(connectors, dict):
+                raise ValueError(f"grading.{criterion}.connectors must be a mapping")
+            for key in ("min_total", "min_distinct", "penalty"):
+                if not _is_number(connectors.get(key)):
+                    raise ValueError(f"grading.{criterion}.connectors.{key} must be a number")
+
+
+class Task:
+    """One assignment: description, content points, word limits and scoring tables.
+
+    Anything the spec leaves out falls back to the built-in end-of-year trip
+    task, so an empty spec is the original assignment. The system prompt is
+    compiled once here and reused for every essay.
+    """
+
+    def __init__(self, task_id, spec=None):
+        spec = spec or {}
+        if not isinstance(spec, dict):
+            raise ValueError(f"task {task_id!r}: the spec must be a mapping")
+        self.id = task_id
+        self.title = spec.get("title", task_id)
+        self.description = spec.get("description", TASK_DESC)
+        self.content_points = spec.get("content_points", REQUIRED_CONTENT_POINTS)
+        self.min_word_count = spec.get("min_word_count", MIN_ESSAI_WORD_COUNT)
+        self.full_mark_word_count = spec.get("full_mark_word_count", FULL_MARK_WORD_COUNT)
+        for field in ("title", "description"):
+            if not isinstance(getattr(self, field), str):
+                raise ValueError(f"{field} must be text")
+        if not isinstance(self.content_points, list) or not all(isinstance(p, str) for p in self.content_points):
+            raise ValueError("content_points must be a list of texts")
+        self.content_points = list(self.content_points)
+        for field in ("min_word_count", "full_mark_word_count"):
+            if not isinstance(getattr(self, field), int) or isinstance(getattr(self, field), bool):
+                raise ValueError(f"{field} must be a whole number")
+        self.config = merge_grading_config(spec.get("grading", {}))
+        self.system = build_initial_system(self.content_points)
+
+    def compute_mark(self, data, word_count):
+        return compute_mark(data, word_count, self.config, self.full_mark_word_count)
+
+
+DEFAULT_TASK = Task("default")
+
+
+def _answered_by_keyed_model(client, answered):
+    # Cache keys name client.model; with a ModelRouter a fallback backend may have answered,
+    # and its result must not be served later as the primary model's
+    name = getattr(client, "name", None)
+    return name is None or all(backend == name for backend in answered)
+
+
+def grade_essay(essay, client, cache=None, trace=NULL_TRACE, task=DEFAULT_TASK, screen=None, on_text=None,
+                on_queue=None, on_graded=None):
+    # Full first-feedback pipeline, shared by the app, the batch CLI and the load test.
+    # Returns (data, scores, feedback); data is None when the essay is rejected or too
+    # short to be marked. on_text streams the answer; on_graded(data, scores, feedback)
+    # persists a marked result before it is cached. Raises GeminiError / ResponseFormatError.
+    if screen is None:
+        with trace.span("prescreen"):
+            screen = PreScreen(essay)
+    if screen.rejection:
+        return None, (0, 0, 0, 0), screen.rejection
+    word_count = count_words(essay)
+    if word_count <= task.min_word_count:
+        if on_graded:
+            on_graded(None, (0, 0, 0, 0), TOO_SHORT_FEEDBACK)
+        return None, (0, 0, 0, 0), TOO_SHORT_FEEDBACK
+
+    with trace.span("prompt_build"):
+        cache_key = initial_cache_key(client.model, essay, task.content_points)
+        system, prompt = task.system, build_initial_prompt(essay, screen.hints)
+    with trace.span("cache_lookup"):
+        data = cache.get(cache_key) if cache else None
+    answered = []
+    if data is None:
+        data = generate_validated(client, prompt, "rubric", system=system, on_text=on_text, on_queue=on_queue,
+                                  trace=trace, on_backend=answered.append)
+    with trace.span("prescreen_merge"):
+        data = screen.merge(data)
+    with trace.span("compute_mark"):
+        scores = task.compute_mark(data, word_count)
+    with trace.span("format_feedback"):
+        feedback = format_feedback(data, scores, task.config)
+    if on_graded:
+        on_graded(data, scores, feedback)
+    if cache and _answered_by_keyed_model(client, answered):
+        cache.put(cache_key, data)
+    return data, scores, feedback
+
+
+def check_revision(raw_response, draft1, essay, client, cache=None, trace=NULL_TRACE, task=DEFAULT_TASK,
+                   on_queue=None, on_checked=None):
+    # Revision pipeline: audits `essay` against the first draft and its stored answer
+    # (raw_response, the JSON kept in the session). Returns (audit_data, feedback);
+    # on_checked(audit_data, feedback) persists it before it is cached.
+    with trace.span("prompt_build"):
+        cache_key = revision_cache_key(client.model, raw_response, draft1, essay, task.content_points)
+        plan = RevisionPlan(json.loads(raw_response or "{}"), draft1, essay)
+        prompt = build_revision_prompt(plan, essay)
+    with trace.span("cache_lookup"):
+        audit_data = cache.get(cache_key) if cache else None
+    answered = []
+    if audit_data is None and not plan.needs_model():
+        # Same text as the first draft: every error is still there, no call needed
+        audit_data = plan.local_only_result()
+    elif audit_data is None:
+        # Unchanged quotes are already marked; the model judges the rest
+        audit_data = plan.merge(generate_validated(client, prompt, "revision", system=REVISION_COACH_PROMPT,
+                                                   on_queue=on_queue, trace=trace, on_backend=answered.append))
+    with trace.span("format_revision_feedback"):
+        feedback = format_revision_feedback(audit_data, task.config)
+    if on_checked:
+        on_checked(audit_data, feedback)
+    if cache and _answered_by_keyed_model(client, answered):
+        cache.put(cache_key, audit_data)
+    return audit_data, feedback
@@ -0,0 +1,63 @@
+import functools
+
+from grading import DEFAULT_TASK
+from prescreen import find_connectors, find_small_i
+
+
+@functools.lru_cache(maxsize=4096)
+def check_paragraph(paragraph):
+    # Cached by paragraph text: while typing, only the paragraph being edited is re-checked
+    return len(paragraph.split()), len(find_small_i(paragraph)), tuple(find_connectors(paragraph))
+
+
+def live_report(essay, task=DEFAULT_TASK):
+    # Local estimate of the length, "i" and connector parts of the mark, with the same
+    # thresholds as Task.compute_mark, so an obviously short text is fixed before a model call
+    word_count, small_i, connectors = 0, 0, []
+    for paragraph in essay.splitlines():
+        words, i_count, found = check_paragraph(paragraph)
+        word_count += words
+        small_i += i_count
+        connectors += found
+
+    if word_count <= task.min_word_count:
+        length = "too_short"
+    elif word_count < task.full_mark_word_count:
+        length = "halved"
+    else:
+        length = "ok"
+    rule = task.config["C1"].get("connectors")
+    connector_penalty = 0.0
+    if rule and (len(connectors) < rule["min_total"] or len(set(connectors)) < rule["min_distinct"]):
+        connector_penalty = rule["penalty"]
+    return {
+        "word_count": word_count, "length": length,
+        "small_i": small_i,
+        "connectors": len(connectors), "distinct_connectors": len(set(connectors)),
+        "connector_penalty": connector_penalty,
+    }
+
+
+def format_live_report(report, task=DEFAULT_TASK):
+    lines = []
+    if report["length"] == "too_short":
+        lines.append(f"⛔ **{report['word_count']} words**: you need more than {task.min_word_count} words "
+                     f"to get a mark at all.")
+    elif report["length"] == "halved":
+        lines.append(f"⚠️ **{report['word_count']} words**: below {task.full_mark_word_count} words "
+                     f"the final mark is halved.")
+    else:
+        lines.append(f"✅ **{report['word_count']} words**")
+
+    if report["small_i"]:
+        lines.append(f"⚠️ Lowercase **i** found {report['small_i']} time(s): the pronoun is always **I**.")
+
+    rule = task.config["C1"].get("connectors")
+    if rule:
+        used = f"{report['connectors']} connectors ({report['distinct_connectors']} different)"
+        if report["connector_penalty"]:
+            lines.append(f"⚠️ {used}: use at least {rule['min_total']}, {rule['min_distinct']} of them different, "
+                         f"or you lose about {report['connector_penalty']} in Adequació.")
+        else:
+            lines.append(f"✅ {used}")
+    return "\n\n".join(lines)
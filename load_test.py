@@ -0,0 +1,215 @@
+"""Simulate a classroom burst against the local mock before a lesson.
+
+    python load_test.py --students 30 --latency 2 --rate-limit 6 --error-rate 0.05
+    python load_test.py --students 30 --max-p95 12 --min-throughput 60   # regression gate
+    python load_test.py --students 40 --slow-primary 15 --hedge-after 2  # hedging at the class peak
+
+Each simulated student runs the app's own pipeline (grading.grade_essay and
+check_revision): pre-screen, grading cache, first feedback (model call,
+scoring, formatting), saving the session, the results store and the Sheet
+outbox, then a revision check on a slightly edited draft. The mock Gemini
+and Sheet endpoints run in-process. Reports throughput, p50/p95/p99 per flow
+and the memory each session's state takes; exits 1 if a --max-p95 /
+--min-throughput gate fails.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from analytics import ResultsStore
+from bench_prescreen import synthetic_essay
+from gemini_client import GeminiClient, GeminiError
+from grading import DEFAULT_TASK, check_revision, count_words, grade_essay
+from grading_cache import GradingCache
+from metrics import Metrics, percentile
+from mock_gemini import start_mock_server
+from model_router import ModelRouter, build_backend
+from response_schema import ResponseFormatError
+from scheduler import RequestScheduler
+from session_store import SessionStore, session_key
+from sheet_outbox import SheetOutbox
+
+
+def revise(essay, rng):
+    # A plausible second draft: one sentence fixed, one sentence added
+    revised = essay.replace(" i ", " I ", 1)
+    return revised.replace("Best wishes,", "I can't wait to see you again.\n\nBest wishes,") \
+        if rng.random() < 0.7 else revised
+
+
+def run_student(i, client, outbox, store, results, cache, metrics, task=DEFAULT_TASK):
+    # One team's visit through the app's own pipeline; returns (session state, {flow: seconds}, error)
+    rng = random.Random(i)
+    essay = synthetic_essay(rng)
+    students = f"Student {i}"
+    key = session_key("LT", [students], task.id)
+    state = {"essay_content": essay}
+    timings = {}
+
+    def record_first(data, scores, feedback):
+        state.update(fb1=feedback, draft1=essay, raw_response=json.dumps(data, ensure_ascii=False) if data else "")
+        store.save(key, "LT", students, state)
+        with trace.span("results_log"):
+            results.record_first(key, task.id, "LT", students, data, scores, count_words(essay))
+        with trace.span("sheet_log"):
+            outbox.enqueue({"type": "FIRST", "Group": "LT", "Students": students,
+                            "Mark": f"{scores[3]}/10", "Draft 1": essay, "FB 1": feedback})
+
+    def record_revision(audit_data, feedback):
+        state.update(essay_content=final, fb2=feedback)
+        store.save(key, "LT", students, state)
+        with trace.span("results_log"):
+            results.record_revision(key, task.id, "LT", students, audit_data, count_words(final))
+        with trace.span("sheet_log"):
+            outbox.enqueue({"type": "REVISION", "Group": "LT", "Students": students,
+                            "Final Essay": final, "FB 2": feedback})
+
+    try:
+        started = time.perf_counter()
+        trace = metrics.trace("first")
+        grade_essay(essay, client, cache, trace, task, on_graded=record_first)
+        timings["first"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        trace = metrics.trace("revision")
+        final = revise(essay, rng)
+        check_revision(state["raw_response"], essay, final, client, cache, trace, task, on_checked=record_revision)
+        timings["revision"] = time.perf_counter() - started
+        return state, timings, ""
+    except (GeminiError, ResponseFormatError) as e:
+        return state, timings, f"{type(e).__name__}: {e}"
+
+
+def run(students, latency=1.0, rate_limit=0, error_rate=0.0, sheet_latency=0.2, max_in_flight=4,
+        max_retries=4, slow_primary=None, hedge_after=2.0, log=sys.stderr):
+    # slow_primary: seconds per answer of a primary backend placed in front of the mock through
+    # a ModelRouter, which hedges to the normal mock after `hedge_after` seconds
+    server, base_url = start_mock_server(latency=latency, rate_limit=rate_limit, error_rate=error_rate,
+                                         sheet_latency=sheet_latency)
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    metrics = Metrics()
+    scheduler = RequestScheduler(max_in_flight=max_in_flight, max_retries=max_retries, base_delay=0.5,
+                                 retry_exceptions=(requests.ConnectionError,))
+    client = GeminiClient("mock-key", base_url=base_url, scheduler=scheduler)
+    primary_server = None
+    if slow_primary is not None:
+        primary_server, primary_url = start_mock_server(latency=slow_primary)
+        primary = build_backend({"kind": "gemini", "model": "slow-primary", "base_url": primary_url,
+                                 "max_in_flight": max_in_flight}, "mock-key")
+        client = ModelRouter([primary, client], initial_hedge_delay=hedge_after)
+    outbox = SheetOutbox(base_url.rsplit("/", 1)[0] + "/sheet", path=os.path.join(workdir, "outbox.sqlite3"),
+                         flush_interval=0.5, metrics=metrics)
+    store = SessionStore(os.path.join(workdir, "sessions.sqlite3"))
+    results = ResultsStore(os.path.join(workdir, "results.sqlite3"))
+    cache = GradingCache(os.path.join(workdir, "grading_cache.sqlite3"))
+
+    print(f"{students} students, mock latency {latency}s, rate limit {rate_limit or 'none'}, "
+          f"error rate {error_rate:.0%}", file=log)
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=students) as pool:
+        outcomes = list(pool.map(lambda i: run_student(i, client, outbox, store, results, cache, metrics),
+                                 range(students)))
+    elapsed = time.monotonic() - started
+    gc.collect()
+    retained, peak = (m - baseline for m in tracemalloc.get_traced_memory())
+    tracemalloc.stop()
+
+    drain_started = time.monotonic()
+    outbox.close()
+    sheet_drain = time.monotonic() - drain_started
+    server.shutdown()
+    if primary_server:
+        primary_server.shutdown()
+
+    report = {"students": students, "seconds": round(elapsed, 2),
+              "failed": sum(1 for _, _, error in outcomes if error),
+              "throughput_per_min": round(60 * students / elapsed, 1),
+              "model_requests": server.requests, "rate_limited": server.rejected, "server_errors": server.errors,
+              "retries": scheduler.stats()["retries"], "sheet_rows": len(server.sheet_rows),
+              "sheet_drain_seconds": round(sheet_drain, 2)}
+    for flow in ("first", "revision"):
+        seconds = [t[flow] for _, t, _ in outcomes if flow in t]
+        report[flow] = {f"p{q}": round(percentile(seconds, q), 3) for q in (50, 95, 99)}
+    state_bytes = [len(json.dumps(state, ensure_ascii=False).encode()) for state, _, _ in outcomes]
+    report["memory_per_session_kb"] = {
+        "state": round(sum(state_bytes) / students / 1024, 1),
+        "retained": round(retained / students / 1024, 1),
+        "peak": round(peak / students / 1024, 1),
+    }
+    if slow_primary is not None:
+        report["router"] = client.stats()
+    report["stages"] = metrics.summary()
+    for _, _, error in outcomes:
+        if error:
+            print(f"  {error}", file=log)
+    return report
+
+
+def print_report(report, out=sys.stdout):
+    print(f"{report['students']} sessions in {report['seconds']}s: {report['throughput_per_min']} students/min, "
+          f"{report['failed']} failed", file=out)
+    print(f"model requests {report['model_requests']} ({report['rate_limited']} rate-limited, "
+          f"{report['server_errors']} 5xx, {report['retries']} retries)", file=out)
+    for flow in ("first", "revision"):
+        p = report[flow]
+        print(f"{flow:9} p50={p['p50']:.2f}s p95={p['p95']:.2f}s p99={p['p99']:.2f}s", file=out)
+    if "router" in report:
+        wins = ", ".join(f"{name} {b['wins']}" for name, b in report["router"]["backends"].items())
+        print(f"router: {report['router']['hedges']} hedges, {report['router']['failovers']} failovers; "
+              f"answers: {wins}", file=out)
+    memory = report["memory_per_session_kb"]
+    print(f"memory per session: {memory['state']} KB state, {memory['retained']} KB retained, "
+          f"{memory['peak']} KB peak", file=out)
+    print(f"sheet: {report['sheet_rows']} rows, outbox drained {report['sheet_drain_seconds']}s after the burst",
+          file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classroom burst against the local mock Gemini server.")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=1.0, help="mock seconds per model answer")
+    parser.add_argument("--rate-limit", type=int, default=0, help="mock concurrent requests before a 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock answers that are 503")
+    parser.add_argument("--sheet-latency", type=float, default=0.2)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--slow-primary", type=float,
+                        help="put a primary backend this slow (seconds) in front, hedged to the mock")
+    parser.add_argument("--hedge-after", type=float, default=2.0, help="hedge delay with --slow-primary")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--max-p95", type=float, help="fail if first-feedback p95 exceeds this (seconds)")
+    parser.add_argument("--min-throughput", type=float, help="fail below this many students per minute")
+    args = parser.parse_args(argv)
+
+    report = run(args.students, args.latency, args.rate_limit, args.error_rate, args.sheet_latency,
+                 args.max_in_flight, slow_primary=args.slow_primary, hedge_after=args.hedge_after)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if report["failed"]:
+        failures.append(f"{report['failed']} sessions failed")
+    if args.max_p95 is not None and report["first"]["p95"] > args.max_p95:
+        failures.append(f"first-feedback p95 {report['first']['p95']}s > {args.max_p95}s")
+    if args.min_throughput is not None and report["throughput_per_min"] < args.min_throughput:
+        failures.append(f"throughput {report['throughput_per_min']}/min < {args.min_throughput}/min")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
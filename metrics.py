@@ -0,0 +1,160 @@
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+USAGE_FIELDS = {
+    "promptTokenCount": "prompt_tokens",
+    "cachedContentTokenCount": "cached_tokens",
+    "candidatesTokenCount": "output_tokens",
+    "totalTokenCount": "total_tokens",
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Span:
+    def __init__(self, metrics, flow, stage, trace_id):
+        self.metrics = metrics
+        self.flow = flow
+        self.stage = stage
+        self.trace_id = trace_id
+        self.fields = {}
+        self.tags = {}
+
+    def add_usage(self, usage):
+        # usageMetadata from a Gemini response; repeated calls (e.g. a repair) add up
+        for source, name in USAGE_FIELDS.items():
+            if source in usage:
+                self.fields[name] = self.fields.get(name, 0) + usage[source]
+
+    def tag(self, name, value):
+        # A label for this span, e.g. which backend answered; counted per value
+        self.tags[name] = value
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record(self.flow, self.stage, time.perf_counter() - self.started,
+                            trace_id=self.trace_id, ok=exc_type is None, tags=self.tags, **self.fields)
+        return False
+
+
+class Trace:
+    # Groups the spans of one feedback request under a shared id
+    def __init__(self, metrics, flow):
+        self.metrics = metrics
+        self.flow = flow
+        self.trace_id = uuid.uuid4().hex[:12]
+
+    def span(self, stage):
+        return Span(self.metrics, self.flow, stage, self.trace_id)
+
+
+class Metrics:
+    """Per-stage latency and token counters, exportable as Prometheus text or a JSONL trace."""
+
+    def __init__(self, trace_path=None, history=1000, enabled=True):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self._lock = threading.Lock()
+        self._durations = defaultdict(lambda: deque(maxlen=history))
+        self._counts = defaultdict(int)
+        self._sums = defaultdict(float)
+        self._errors = defaultdict(int)
+        self._tokens = defaultdict(int)
+        self._tags = defaultdict(int)
+
+    def trace(self, flow):
+        return Trace(self, flow)
+
+    def record(self, flow, stage, seconds, trace_id=None, ok=True, tags=None, **fields):
+        if not self.enabled:
+            return
+        key = (flow, stage)
+        with self._lock:
+            self._durations[key].append(seconds)
+            self._counts[key] += 1
+            self._sums[key] += seconds
+            if not ok:
+                self._errors[key] += 1
+            for name, value in fields.items():
+                self._tokens[(flow, name)] += value
+            for name, value in (tags or {}).items():
+                self._tags[(flow, stage, name, value)] += 1
+            if self.trace_path:
+                event = {"ts": time.time(), "trace": trace_id, "flow": flow, "stage": stage,
+                         "seconds": round(seconds, 6), "ok": ok, **(tags or {}), **fields}
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(event) + "\n")
+
+    def summary(self):
+        with self._lock:
+            rows = []
+            for (flow, stage), durations in sorted(self._durations.items()):
+                values = list(durations)
+                rows.append({
+                    "flow": flow, "stage": stage, "count": self._counts[(flow, stage)],
+                    "errors": self._errors[(flow, stage)],
+                    "p50_ms": round(percentile(values, 50) * 1000, 3),
+                    "p95_ms": round(percentile(values, 95) * 1000, 3),
+                })
+            return rows
+
+    def tokens(self):
+        with self._lock:
+            return {f"{flow}.{name}": value for (flow, name), value in sorted(self._tokens.items())}
+
+    def tag_counts(self):
+        with self._lock:
+            return {f"{flow}.{stage}.{name}={value}": count
+                    for (flow, stage, name, value), count in sorted(self._tags.items())}
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP essay_feedback_stage_seconds Time spent in each stage of a feedback request.",
+            "# TYPE essay_feedback_stage_seconds summary",
+        ]
+        with self._lock:
+            for (flow, stage), durations in sorted(self._durations.items()):
+                labels = f'flow="{flow}",stage="{stage}"'
+                values = list(durations)
+                for q in (0.5, 0.95, 0.99):
+                    lines.append(f'essay_feedback_stage_seconds{{{labels},quantile="{q}"}} '
+                                 f'{percentile(values, q * 100):.6f}')
+                lines.append(f"essay_feedback_stage_seconds_sum{{{labels}}} {self._sums[(flow, stage)]:.6f}")
+                lines.append(f"essay_feedback_stage_seconds_count{{{labels}}} {self._counts[(flow, stage)]}")
+            lines += [
+                "# HELP essay_feedback_stage_errors_total Stages that ended with an exception.",
+                "# TYPE essay_feedback_stage_errors_total counter",
+            ]
+            for (flow, stage), errors in sorted(self._errors.items()):
+                lines.append(f'essay_feedback_stage_errors_total{{flow="{flow}",stage="{stage}"}} {errors}')
+            lines += [
+                "# HELP essay_feedback_tokens_total Gemini tokens reported in usageMetadata.",
+                "# TYPE essay_feedback_tokens_total counter",
+            ]
+            for (flow, name), value in sorted(self._tokens.items()):
+                lines.append(f'essay_feedback_tokens_total{{flow="{flow}",kind="{name}"}} {value}')
+            lines += [
+                "# HELP essay_feedback_stage_tags_total Spans by label value, e.g. the backend that answered.",
+                "# TYPE essay_feedback_stage_tags_total counter",
+            ]
+            for (flow, stage, name, value), count in sorted(self._tags.items()):
+                lines.append(f'essay_feedback_stage_tags_total{{flow="{flow}",stage="{stage}",{name}="{value}"}} '
+                             f'{count}')
+        return "\n".join(lines) + "\n"
+
+
+# Used when no metrics are wanted; spans still work but nothing is recorded
+NULL_METRICS = Metrics(enabled=False)
+NULL_TRACE = NULL_METRICS.trace("none")
@@ -0,0 +1,218 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_FEEDBACK = {
+    "C1": {
+        "MPoPOC": [], "WRF": [], "WG": [], "MCP": [],
+        "CS": [{"q": "We are going to Rome, it will be great", "r": "Two sentences joined with only a comma."}],
+        "IC": [], "GP": [],
+        "CONN": ["and", "but", "because", "then", "also", "however"]
+    },
+    "C2": {
+        "SpCap": [{"q": "beautifull", "r": "Check the spelling of this word."}],
+        "WWO": [], "VTF": [], "SVA": [], "ART": [], "PREP": [], "PRO": [], "COLL": [],
+        "SI": [], "CSU": []
+    },
+    "C3": {"VOC": "1.0"},
+    "OVERALL": {"IMP": "A clear email with a few accuracy problems."}
+}
+
+CANNED_REVISION = {
+    "audit": {
+        "C1": {"CS": [{"q": "We are going to Rome, it will be great", "status": "fixed", "comment": ""}]},
+        "C2": {"SpCap": [{"q": "beautifull", "status": "still_present", "comment": "Check the spelling."}]}
+    },
+    "new_errors": [],
+    "VOC_CHANGE": "Stayed the same.",
+    "OVERALL": "Good effort: one of the two errors is fixed."
+}
+
+
+def _usage(payload, text):
+    # Rough token counts (4 characters per token), enough to exercise usage accounting
+    prompt = json.dumps(payload.get("contents", [])) + json.dumps(payload.get("systemInstruction", ""))
+    usage = {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4}
+    if payload.get("cachedContent"):
+        usage["cachedContentTokenCount"] = 900
+        usage["promptTokenCount"] += 900
+    usage["totalTokenCount"] = usage["promptTokenCount"] + usage["candidatesTokenCount"]
+    return usage
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_stream(self, text, latency, usage, chunks=8):
+        # Server-sent events over chunked transfer encoding, spread across `latency`
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = len(text) // chunks + 1
+        for start in range(0, len(text), size):
+            time.sleep(latency / chunks)
+            part = {"candidates": [{"content": {"parts": [{"text": text[start:start + size]}]}}],
+                    "usageMetadata": usage}
+            event = f"data: {json.dumps(part)}\r\n\r\n".encode()
+            self.wfile.write(f"{len(event):X}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_chat(self, text, latency, payload):
+        # OpenAI-compatible /chat/completions, for the model router's second backends
+        usage = {"prompt_tokens": len(json.dumps(payload.get("messages", []))) // 4,
+                 "completion_tokens": len(text) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if not payload.get("stream"):
+            time.sleep(latency)
+            self._send_json(200, {"choices": [{"message": {"role": "assistant", "content": text}}],
+                                  "usage": usage})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = len(text) // 8 + 1
+        parts = [{"choices": [{"delta": {"content": text[i:i + size]}}]} for i in range(0, len(text), size)]
+        parts.append({"choices": [], "usage": usage})
+        for part in parts:
+            time.sleep(latency / len(parts))
+            event = f"data: {json.dumps(part)}\r\n\r\n".encode()
+            self.wfile.write(f"{len(event):X}\r\n".encode() + event + b"\r\n")
+        event = b"data: [DONE]\r\n\r\n"
+        self.wfile.write(f"{len(event):X}\r\n".encode() + event + b"\r\n0\r\n\r\n")
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        if not self.path.startswith("/sheet"):
+            # Every model-side payload is recorded so callers can inspect what was sent
+            payload = json.loads(body or b"{}")
+            with server.lock:
+                server.payloads.append((self.path.split("?")[0], payload))
+
+        if "/cachedContents" in self.path:
+            with server.lock:
+                name = f"cachedContents/mock-{len(server.cached_contents) + 1}"
+                server.cached_contents[name] = payload.get("systemInstruction")
+            self._send_json(200, {"name": name, "model": payload.get("model")})
+            return
+
+        if self.path.startswith("/sheet"):
+            # Stand-in for the Apps Script web app behind GOOGLE_SHEET_URL
+            time.sleep(server.sheet_latency)
+            record = json.loads(body or b"{}")
+            with server.lock:
+                if record.get("type") == "BATCH":
+                    server.sheet_rows.extend(record["records"])
+                else:
+                    server.sheet_rows.append(record)
+            self._send_json(200, {"result": "success"})
+            return
+
+        with server.lock:
+            server.requests += 1
+            if server.rate_limit and server.active >= server.rate_limit:
+                server.rejected += 1
+                rejected = True
+            else:
+                server.active += 1
+                rejected = False
+        if not rejected and payload.get("cachedContent") and payload["cachedContent"] not in server.cached_contents:
+            with server.lock:
+                server.active -= 1
+            self._send_json(404, {"error": {"code": 404, "status": "NOT_FOUND"}})
+            return
+        if rejected:
+            self._send_json(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}},
+                            {"Retry-After": "1"})
+            return
+        if server.error_rate and random.random() < server.error_rate:
+            with server.lock:
+                server.active -= 1
+                server.errors += 1
+            self._send_json(503, {"error": {"code": 503, "status": "UNAVAILABLE"}})
+            return
+
+        try:
+            # The revision check is recognised by the audit field of its response schema
+            revision = "audit" in json.dumps(payload.get("generationConfig", payload.get("response_format", {})))
+            text = json.dumps(server.revision if revision else server.feedback)
+            if self.path.endswith("/chat/completions"):
+                self._send_chat(text, server.latency, payload)
+            elif ":streamGenerateContent" in self.path:
+                self._send_stream(text, server.latency, _usage(payload, text))
+            else:
+                time.sleep(server.latency)
+                self._send_json(200, {"candidates": [{"content": {"parts": [{"text": text}]}}],
+                                      "usageMetadata": _usage(payload, text)})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. a hedged request that lost the race
+            pass
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+def start_mock_server(latency=0.5, rate_limit=0, feedback=None, port=0, error_rate=0.0, sheet_latency=0.0,
+                      revision=None):
+    # rate_limit: concurrent requests allowed before answering 429 (0 = unlimited)
+    # error_rate: fraction of model requests answered with a 503
+    server = ThreadingHTTPServer(("127.0.0.1", port), _MockHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.rate_limit = rate_limit
+    server.error_rate = error_rate
+    server.sheet_latency = sheet_latency
+    server.feedback = feedback or CANNED_FEEDBACK
+    server.revision = revision or CANNED_REVISION
+    server.lock = threading.Lock()
+    server.active = 0
+    server.requests = 0
+    server.rejected = 0
+    server.errors = 0
+    server.sheet_rows = []
+    server.payloads = []
+    server.cached_contents = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    # python mock_gemini.py [--latency 0.5] [--rate-limit 0] [--error-rate 0] [--port 8765]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local stand-in for Gemini and the Sheet web app.")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per model answer")
+    parser.add_argument("--rate-limit", type=int, default=0, help="concurrent requests before a 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered with a 503")
+    parser.add_argument("--sheet-latency", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server, base_url = start_mock_server(args.latency, args.rate_limit, port=args.port,
+                                         error_rate=args.error_rate, sheet_latency=args.sheet_latency)
+    print(f"Mock Gemini listening on {base_url} (Ctrl+C to stop)")
+    print(f"Mock sheet endpoint at {base_url.rsplit('/', 1)[0]}/sheet")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,322 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+from gemini_client import DEFAULT_BASE_URL, GeminiClient, GeminiError, interrupted_stream
+from metrics import percentile
+from scheduler import RETRYABLE_STATUS, RequestScheduler
+
+
+def to_json_schema(schema):
+    # Gemini's OpenAPI subset ("OBJECT", propertyOrdering) to plain JSON Schema
+    if isinstance(schema, list):
+        return [to_json_schema(s) for s in schema]
+    if not isinstance(schema, dict):
+        return schema
+    converted = {}
+    for key, value in schema.items():
+        if key == "propertyOrdering":
+            continue
+        if key == "type":
+            converted[key] = value.lower()
+        elif key == "properties":
+            converted[key] = {name: to_json_schema(s) for name, s in value.items()}
+        else:
+            converted[key] = to_json_schema(value)
+    return converted
+
+
+def openai_usage(usage):
+    # Chat-completions usage in Gemini's usageMetadata names, so metrics add up the same way
+    return {"promptTokenCount": usage.get("prompt_tokens", 0),
+            "candidatesTokenCount": usage.get("completion_tokens", 0),
+            "totalTokenCount": usage.get("total_tokens", 0)}
+
+
+class OpenAICompatibleClient(GeminiClient):
+    """Chat-completions backend: OpenAI, or a local server (vLLM, llama.cpp, Ollama) at its /v1 URL.
+
+    Shares the pooled session, admission queue and error handling of
+    GeminiClient; only the wire format differs.
+    """
+
+    def __init__(self, api_key, model, base_url, **kwargs):
+        kwargs["context_cache_ttl"] = 0
+        super().__init__(api_key, model=model, base_url=base_url, **kwargs)
+        self.name = f"openai:{model}@{self.base_url}"
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def post(self, method, payload, stream=False):
+        return self.session.post(f"{self.base_url}/chat/completions", json={**payload, "stream": stream},
+                                 timeout=self.timeout, stream=stream)
+
+    def _payload(self, prompt, temperature, response_schema=None, system=None, use_cache=True):
+        messages = [{"role": "system", "content": system}] if system else []
+        data = {"model": self.model, "temperature": temperature,
+                "messages": messages + [{"role": "user", "content": prompt}]}
+        if response_schema:
+            data["response_format"] = {"type": "json_schema", "json_schema": {
+                "name": "feedback", "schema": to_json_schema(response_schema)}}
+        return data
+
+    def generate(self, prompt, temperature=0.0, on_queue=None, response_schema=None, system=None,
+                 on_usage=None, on_backend=None, before_send=None):
+        response = self._request("chat", prompt, temperature, response_schema, system, on_queue,
+                                 before_send=before_send)
+        try:
+            body = response.json()
+            raw_text = body["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise GeminiError("The teacher returned an empty answer. Please try again.")
+        if not raw_text:
+            raise GeminiError("The teacher returned an empty answer. Please try again.")
+        if on_usage and body.get("usage"):
+            on_usage(openai_usage(body["usage"]))
+        if on_backend:
+            on_backend(self.name)
+        return raw_text
+
+    def generate_stream(self, prompt, on_text, temperature=0.0, on_queue=None, response_schema=None,
+                        system=None, on_usage=None, on_backend=None, before_send=None):
+        fragments = []
+        usage = {}
+
+        def consume(response):
+            # Each scheduler attempt starts from an empty answer
+            fragments.clear()
+            usage.clear()
+            with interrupted_stream(fragments):
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:") or line.strip() == "data: [DONE]":
+                        continue
+                    chunk = json.loads(line[len("data:"):])
+                    usage.update(chunk.get("usage") or {})
+                    for choice in chunk.get("choices", []):
+                        fragment = (choice.get("delta") or {}).get("content")
+                        if fragment:
+                            fragments.append(fragment)
+                            on_text(fragment)
+
+        self._request("chat", prompt, temperature, response_schema, system, on_queue, consume, before_send)
+        if not fragments:
+            raise GeminiError("The teacher returned an empty answer. Please try again.")
+        if on_usage and usage:
+            on_usage(openai_usage(usage))
+        if on_backend:
+            on_backend(self.name)
+        return "".join(fragments)
+
+
+def build_backend(spec, default_api_key=None, max_in_flight=4, max_retries=0, **client_kwargs):
+    # spec: {"kind": "gemini" | "openai", "model": ..., "base_url": ..., "api_key": ...}
+    # Backends retry little themselves: on a 429 it is faster to move on to the next one
+    scheduler = RequestScheduler(max_in_flight=spec.get("max_in_flight", max_in_flight),
+                                 max_retries=spec.get("max_retries", max_retries))
+    kind = spec.get("kind", "gemini")
+    if kind == "gemini":
+        return GeminiClient(spec.get("api_key", default_api_key), model=spec["model"],
+                            base_url=spec.get("base_url", DEFAULT_BASE_URL), scheduler=scheduler,
+                            **client_kwargs)
+    if kind == "openai":
+        return OpenAICompatibleClient(spec.get("api_key", ""), spec["model"], spec["base_url"],
+                                      scheduler=scheduler, **client_kwargs)
+    raise ValueError(f"unknown backend kind {kind!r}")
+
+
+class _Superseded(Exception):
+    # Raised inside a losing attempt so it stops reading, or never sends once admitted
+    pass
+
+
+class _BackendStats:
+    def __init__(self, history):
+        self.latencies = deque(maxlen=history)
+        self.wins = 0
+        self.failures = 0
+
+
+class ModelRouter:
+    """Sends each feedback request to an ordered list of model backends.
+
+    The first backend gets the request. If it has not answered after its p95
+    latency (or `initial_hedge_delay` until enough samples exist), the same
+    request is also sent to the next backend and whichever answers first wins.
+    A 429, 5xx or connection failure fails over to the next backend at once.
+    Drop-in for GeminiClient: same generate/generate_stream signatures, and
+    on_backend(name) reports which backend answered.
+    """
+
+    def __init__(self, backends, hedge=True, initial_hedge_delay=20.0, min_hedge_delay=2.0,
+                 min_samples=20, history=200):
+        if not backends:
+            raise ValueError("ModelRouter needs at least one backend")
+        self.backends = list(backends)
+        self.hedge = hedge
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.hedges = 0
+        self.failovers = 0
+        self._stats = {b.name: _BackendStats(history) for b in self.backends}
+        self._lock = threading.Lock()
+
+    # The primary backend identifies results in the grading cache and owns the prompt cache;
+    # callers compare on_backend names with `name` to tell a fallback's answer apart
+    @property
+    def model(self):
+        return self.backends[0].model
+
+    @property
+    def name(self):
+        return self.backends[0].name
+
+    @property
+    def context_cache(self):
+        return getattr(self.backends[0], "context_cache", None)
+
+    def hedge_delay(self, backend):
+        with self._lock:
+            latencies = list(self._stats[backend.name].latencies)
+        if len(latencies) < self.min_samples:
+            return self.initial_hedge_delay
+        return max(self.min_hedge_delay, percentile(latencies, 95))
+
+    def _start(self, attempt_id, backend, events, cancelled, streaming, args, kwargs):
+        def forward(kind):
+            def callback(value):
+                if attempt_id in cancelled:
+                    # A queue notice is dropped: raising while queued would abandon the scheduler ticket
+                    # from inside its wait; a stream fragment stops the losing stream
+                    if kind == "queue":
+                        return
+                    raise _Superseded()
+                events.put((kind, attempt_id, value))
+            return callback
+
+        def check_cancelled():
+            # Once admitted, a request another backend already answered is not sent
+            if attempt_id in cancelled:
+                raise _Superseded()
+
+        def run():
+            started = time.monotonic()
+            usage = {}
+            try:
+                call_kwargs = {**kwargs, "on_queue": forward("queue"), "on_usage": usage.update,
+                               "before_send": check_cancelled}
+                if streaming:
+                    text = backend.generate_stream(*args, forward("text"), **call_kwargs)
+                else:
+                    text = backend.generate(*args, **call_kwargs)
+                events.put(("done", attempt_id, (text, usage, time.monotonic() - started)))
+            except Exception as e:
+                events.put(("error", attempt_id, e))
+
+        # One thread per attempt rather than a fixed pool: an attempt waiting in its backend's
+        # admission queue must not keep a hedge or failover attempt from starting
+        threading.Thread(target=run, name=f"model-router-{backend.name}", daemon=True).start()
+
+    def _route(self, args, kwargs, on_text=None, on_queue=None, on_usage=None, on_backend=None):
+        # Every callback runs on the caller's thread: Streamlit can only draw from there
+        events = queue.Queue()
+        cancelled = set()
+        remaining = list(self.backends)
+        running = {}
+        owner = None  # the attempt whose stream is being shown
+        last_error = None
+        streaming = on_text is not None
+
+        def launch():
+            backend = remaining.pop(0)
+            attempt_id = object()
+            running[attempt_id] = backend
+            self._start(attempt_id, backend, events, cancelled, streaming, args, kwargs)
+
+        launch()
+        hedge_at = time.monotonic() + self.hedge_delay(self.backends[0]) if self.hedge else None
+        while running:
+            timeout = None
+            if hedge_at is not None and remaining:
+                timeout = max(0.0, hedge_at - time.monotonic())
+            try:
+                kind, attempt_id, value = events.get(timeout=timeout)
+            except queue.Empty:
+                # Slower than usual: race a duplicate request on the next backend
+                hedge_at = None
+                with self._lock:
+                    self.hedges += 1
+                launch()
+                continue
+            if attempt_id not in running:
+                continue
+            backend = running[attempt_id]
+            if attempt_id in cancelled:
+                # A losing attempt (stopped with _Superseded, failed, or finished after the stream
+                # on screen was chosen): only the winner's answer counts
+                if kind in ("done", "error"):
+                    del running[attempt_id]
+                continue
+
+            if kind == "queue":
+                if on_queue and owner in (None, attempt_id):
+                    on_queue(value)
+            elif kind == "text":
+                if owner is None:
+                    owner = attempt_id
+                    cancelled.update(a for a in running if a is not attempt_id)
+                if owner is attempt_id:
+                    on_text(value)
+            elif kind == "done":
+                text, usage, seconds = value
+                cancelled.update(a for a in running if a is not attempt_id)
+                with self._lock:
+                    stats = self._stats[backend.name]
+                    stats.wins += 1
+                    stats.latencies.append(seconds)
+                if on_usage and usage:
+                    on_usage(usage)
+                if on_backend:
+                    on_backend(backend.name)
+                return text
+            else:
+                del running[attempt_id]
+                last_error = value
+                with self._lock:
+                    self._stats[backend.name].failures += 1
+                if owner is attempt_id or not isinstance(value, GeminiError):
+                    # Part of this answer is already on screen, or it is a bug: don't splice
+                    raise value
+                if value.status is not None and value.status not in RETRYABLE_STATUS:
+                    if not running:
+                        raise value
+                elif remaining and not running:
+                    with self._lock:
+                        self.failovers += 1
+                    launch()
+        raise last_error
+
+    def generate(self, prompt, temperature=0.0, on_queue=None, response_schema=None, system=None,
+                 on_usage=None, on_backend=None):
+        return self._route((prompt,), {"temperature": temperature, "response_schema": response_schema,
+                                       "system": system},
+                           on_queue=on_queue, on_usage=on_usage, on_backend=on_backend)
+
+    def generate_stream(self, prompt, on_text, temperature=0.0, on_queue=None, response_schema=None,
+                        system=None, on_usage=None, on_backend=None):
+        return self._route((prompt,), {"temperature": temperature, "response_schema": response_schema,
+                                       "system": system},
+                           on_text=on_text, on_queue=on_queue, on_usage=on_usage, on_backend=on_backend)
+
+    def stats(self):
+        with self._lock:
+            backends = {name: {"wins": s.wins, "failures": s.failures,
+                               "latency_p95": percentile(list(s.latencies), 95)}
+                        for name, s in self._stats.items()}
+            return {"hedges": self.hedges, "failovers": self.failovers, "backends": backends}
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
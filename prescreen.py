@@ -0,0 +1,171 @@
+import re
+
+# Longest first, so "first of all" wins over "first"
+CONNECTORS = sorted([
+    "and", "but", "or", "so", "because", "also", "then", "although", "though", "however",
+    "moreover", "furthermore", "besides", "therefore", "finally", "firstly", "secondly",
+    "thirdly", "lastly", "first of all", "in addition", "in conclusion", "to sum up",
+    "on the other hand", "as well as", "after that", "for example", "for instance",
+    "such as", "while", "whereas", "since", "as a result", "anyway", "by the way", "unless",
+    "nevertheless", "nonetheless", "when", "if", "even if", "even though", "meanwhile", "in fact",
+    "instead", "otherwise", "as soon as", "so that", "in order to", "after all", "what is more",
+    "on the one hand",
+], key=len, reverse=True)
+
+# Sentence openers that need a comma after them
+INTRODUCTORY_PHRASES = sorted([
+    "first of all", "firstly", "secondly", "thirdly", "finally", "lastly", "however",
+    "moreover", "furthermore", "in addition", "in conclusion", "to sum up", "on the other hand",
+    "anyway", "by the way", "for example", "for instance", "therefore",
+], key=len, reverse=True)
+
+# Words that open a clause: "and", "or" and "so" before one of these join two clauses
+# ("so we went"); before anything else they join words or intensify ("Rome and Florence", "so happy")
+CLAUSE_OPENERS = frozenset("""
+i we you he she they it there then also that
+""".split())
+# After "however", these still start a clause ("However the hotel is..."), unlike "However much it costs"
+_SUBJECT_STARTS = CLAUSE_OPENERS | frozenset("the a an my our your his her their this these those some".split())
+_CLAUSE_CONNECTORS = ("and", "or", "so")
+
+# Frequent English words; almost any English paragraph is full of them
+ENGLISH_WORDS = frozenset("""
+a an the and but or so because i you he she it we they me my your our their his her
+is are was were be been am do does did have has had will would can could going to
+of in on at for with from about this that there these those not all very some
+""".split())
+
+MAX_ESSAY_WORDS = 600
+MAX_ESSAY_CHARS = 6000
+MIN_ENGLISH_SHARE = 0.15
+
+EMPTY_MESSAGE = "Your composition is empty. Please write your text before asking for feedback."
+TOO_LONG_MESSAGE = (f"Your composition is much longer than the task asks for (more than {MAX_ESSAY_WORDS} words). "
+                    "Please submit only your own email.")
+NOT_ENGLISH_MESSAGE = "Your composition does not look like English. Please write your text in English."
+
+_WORD = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)?")
+# Matched against the lowercased essay: much faster than re.IGNORECASE on a long alternation
+_CONNECTOR = re.compile(r"\b(" + "|".join(re.escape(c) for c in CONNECTORS) + r")\b(?=[^\w]*(\w*))")
+_SMALL_I = re.compile(r"(?<![\w'’])i\b(?!\.e\.)")
+_LOWERCASE_START = re.compile(r"[.!?]\s+([a-z]\w*)")
+# "e.g. we" is not a new sentence
+_ABBREVIATIONS = ("e.g", "i.e", "etc")
+_INTRODUCTORY = re.compile(r"(?:^|[.!?]\s+)(" + "|".join(re.escape(p) for p in INTRODUCTORY_PHRASES)
+                           + r")\s+(?=(\w+))", re.IGNORECASE | re.MULTILINE)
+
+
+def find_connectors(text):
+    found = []
+    text = text.lower()
+    for m in _CONNECTOR.finditer(text):
+        connector = m.group(1)
+        # "and"/"or"/"so" only count where they join clauses: after punctuation or before a subject
+        if connector in _CLAUSE_CONNECTORS and m.group(2) not in CLAUSE_OPENERS:
+            before = text[max(0, m.start() - 4):m.start()].rstrip()
+            if before and before[-1] not in ",;:.!?":
+                continue
+        found.append(connector)
+    return found
+
+
+def find_missing_introductory_commas(text):
+    found = []
+    for m in _INTRODUCTORY.finditer(text):
+        phrase, following = m.group(1), m.group(2).lower()
+        # "In addition to Rome we..." and "However much it costs, ..." need no comma there
+        if following == "to" or (phrase.lower() == "however" and following not in _SUBJECT_STARTS):
+            continue
+        found.append(m)
+    return found
+
+
+def find_small_i(text):
+    return list(_SMALL_I.finditer(text))
+
+
+def merge_connectors(model_connectors, local_connectors):
+    # The model's list, plus every local find it missed: a connector the local list
+    # counts more often than the model did is added the difference in times
+    merged = [c for c in model_connectors if isinstance(c, str)]
+    counts = {}
+    for connector in merged:
+        counts[connector.lower()] = counts.get(connector.lower(), 0) + 1
+    for connector in local_connectors:
+        if counts.get(connector, 0) > 0:
+            counts[connector] -= 1
+        else:
+            merged.append(connector)
+    return merged
+
+
+def _context(text, start, end, width=8):
+    # The quote shown to the student: the match plus a few surrounding words
+    left = text.rfind(" ", 0, max(0, start - width)) + 1
+    right = text.find(" ", min(len(text), end + width))
+    return " ".join(text[left:right if right != -1 else len(text)].split())
+
+
+class PreScreen:
+    """Deterministic checks that run before the model call.
+
+    `rejection` is set for inputs that should never reach the API (empty,
+    huge paste, not English). Otherwise C1/C2 hold local findings in the same
+    shape as the model's answer: SI is owned by this stage, CONN is merged
+    with the model's own list (a fixed word list cannot know every
+    connector). `hints` holds possible GP and IC errors that are sent to the
+    model to confirm: a regex cannot tell every sentence opener apart, so
+    they never cost marks on their own.
+    """
+
+    # Codes the model is told to leave empty
+    LOCAL_CODES = {"C1": (), "C2": ("SI",)}
+
+    def __init__(self, essay):
+        self.rejection = None
+        self.C1 = {"CONN": []}
+        self.C2 = {"SI": []}
+        self.hints = {"GP": [], "IC": []}
+
+        stripped = essay.strip()
+        if not stripped:
+            self.rejection = EMPTY_MESSAGE
+            return
+        if len(stripped) > MAX_ESSAY_CHARS:
+            self.rejection = TOO_LONG_MESSAGE
+            return
+        words = _WORD.findall(stripped)
+        if len(words) > MAX_ESSAY_WORDS:
+            self.rejection = TOO_LONG_MESSAGE
+            return
+        if not words or sum(w.lower() in ENGLISH_WORDS for w in words) < MIN_ENGLISH_SHARE * len(words):
+            self.rejection = NOT_ENGLISH_MESSAGE
+            return
+
+        self.C1["CONN"] = find_connectors(stripped)
+        self.C2["SI"] = [{"q": _context(stripped, m.start(), m.end()), "r": "The pronoun 'I' is always a capital letter."}
+                         for m in find_small_i(stripped)]
+        if stripped[0].islower():
+            self.hints["GP"].append({"q": _context(stripped, 0, 1), "r": "A sentence starts with a capital letter."})
+        for m in _LOWERCASE_START.finditer(stripped):
+            if m.group(1) != "i" and not stripped.endswith(_ABBREVIATIONS, 0, m.start()):
+                self.hints["GP"].append({"q": _context(stripped, m.start(), m.end()),
+                                         "r": "A sentence starts with a capital letter."})
+        self.hints["IC"] = [{"q": _context(stripped, m.start(1), m.end()),
+                             "r": f"Put a comma after \"{m.group(1)}\" at the start of a sentence."}
+                            for m in find_missing_introductory_commas(stripped)]
+
+    def merge(self, data):
+        # Returns a copy of the model's answer with SI filled in and the local connectors added
+        merged = {**data}
+        for criterion in ("C1", "C2"):
+            if criterion not in data:
+                # A streamed answer that has not reached this criterion yet
+                continue
+            section = {**data[criterion]}
+            for code in self.LOCAL_CODES[criterion]:
+                section[code] = getattr(self, criterion)[code]
+            if criterion == "C1":
+                section["CONN"] = merge_connectors(section.get("CONN") or [], self.C1["CONN"])
+            merged[criterion] = section
+        return merged
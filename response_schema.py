@@ -0,0 +1,95 @@
+import json
+import re
+
+# Schemas use the OpenAPI subset Gemini accepts as `responseSchema`, so the same
+# dict is sent with the request and compiled here into a local validator.
+
+
+class ResponseFormatError(ValueError):
+    def __init__(self, message, raw=""):
+        super().__init__(message)
+        self.raw = raw
+
+
+def _type_check(expected, path):
+    checks = {
+        "OBJECT": lambda v: isinstance(v, dict),
+        "ARRAY": lambda v: isinstance(v, list),
+        "STRING": lambda v: isinstance(v, str),
+        "NUMBER": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+        "INTEGER": lambda v: isinstance(v, int) and not isinstance(v, bool),
+        "BOOLEAN": lambda v: isinstance(v, bool),
+    }
+    check = checks[expected]
+
+    def validate(value):
+        if not check(value):
+            raise ResponseFormatError(f"{path or 'response'} should be {expected.lower()}, "
+                                      f"got {type(value).__name__}")
+    return validate
+
+
+def compile_schema(schema, path=""):
+    """Turns a schema dict into a validator function, once.
+
+    The validator checks the value in place and returns it; optional ARRAY
+    properties that the model left out are filled in as empty lists, which is
+    what the scoring code expects.
+    """
+    type_check = _type_check(schema["type"], path)
+    nullable = schema.get("nullable", False)
+    enum = set(schema["enum"]) if "enum" in schema else None
+
+    if schema["type"] == "OBJECT":
+        properties = {key: compile_schema(sub, f"{path}.{key}" if path else key)
+                      for key, sub in schema.get("properties", {}).items()}
+        required = schema.get("required", [])
+        default_lists = [key for key, sub in schema.get("properties", {}).items()
+                         if sub["type"] == "ARRAY" and key not in required]
+
+        def validate(value):
+            if value is None and nullable:
+                return value
+            type_check(value)
+            for key in required:
+                if key not in value:
+                    raise ResponseFormatError(f"missing key '{key}' in {path or 'response'}")
+            for key in default_lists:
+                value.setdefault(key, [])
+            for key, item in value.items():
+                if key in properties:
+                    properties[key](item)
+            return value
+    elif schema["type"] == "ARRAY":
+        item_validator = compile_schema(schema["items"], f"{path}[]")
+
+        def validate(value):
+            if value is None and nullable:
+                return value
+            type_check(value)
+            for item in value:
+                item_validator(item)
+            return value
+    else:
+        def validate(value):
+            if value is None and nullable:
+                return value
+            type_check(value)
+            if enum is not None and value not in enum:
+                raise ResponseFormatError(f"{path} must be one of {sorted(enum)}, got {value!r}")
+            return value
+    return validate
+
+
+def parse_json_response(raw_text, validator):
+    # Remove Markdown code blocks if the AI included them
+    clean_json = re.sub(r'^```json\s*|```$', '', raw_text, flags=re.MULTILINE).strip()
+    try:
+        data = json.loads(clean_json)
+    except json.JSONDecodeError as e:
+        raise ResponseFormatError(f"invalid JSON: {e}", raw_text)
+    try:
+        return validator(data)
+    except ResponseFormatError as e:
+        e.raw = raw_text
+        raise
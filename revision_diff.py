@@ -0,0 +1,84 @@
+import difflib
+import re
+
+# Codes that describe the essay as a whole rather than a quoted passage; the
+# model always has to re-read the full new version to judge them
+GLOBAL_CODES = {"MPoPOC", "WRF", "WG", "MCP"}
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+
+
+def quote_pattern(quote):
+    # Whitespace-insensitive, but case and punctuation must match: a changed comma
+    # or capital letter may be exactly the fix
+    words = [re.escape(w) for w in quote.split()]
+    return re.compile(r'(?<!\w)' + r'\s+'.join(words) + r'(?!\w)')
+
+
+class RevisionPlan:
+    """What the revision check still needs from the model.
+
+    Quotes from the first analysis that sit in a sentence the student left
+    unchanged are marked `still_present` locally. Only the remaining errors and
+    the passages that changed since the first draft go into the prompt.
+    """
+
+    def __init__(self, original_errors, original_draft, new_essay):
+        self.local_audit = {"C1": {}, "C2": {}}
+        self.unresolved = {"C1": {}, "C2": {}}
+        self.needs_full_text = False
+        self.unchanged = _WHITESPACE.sub(" ", original_draft).strip() == _WHITESPACE.sub(" ", new_essay).strip()
+
+        old_sentences = split_sentences(original_draft)
+        new_sentences = split_sentences(new_essay)
+        matcher = difflib.SequenceMatcher(None, old_sentences, new_sentences, autojunk=False)
+        opcodes = matcher.get_opcodes()
+        self.changed_passages = [" ".join(new_sentences[j1:j2]) for tag, _, _, j1, j2 in opcodes
+                                 if tag in ("replace", "insert")]
+        # Runs of first-draft sentences the student left exactly as they were
+        unchanged_runs = [" ".join(old_sentences[i1:i2]) for tag, i1, i2, _, _ in opcodes if tag == "equal"]
+
+        for criterion in ("C1", "C2"):
+            for code, errors in original_errors.get(criterion, {}).items():
+                if code == "CONN":
+                    continue
+                for error in errors:
+                    if not isinstance(error, dict):
+                        continue
+                    quote = error.get("q", "")
+                    # Only a quote inside an unchanged sentence is certainly still there: a short
+                    # quote ("sea") can also appear in the fixed sentence ("the sea")
+                    if self.unchanged or (quote and code not in GLOBAL_CODES
+                                          and any(quote_pattern(quote).search(run) for run in unchanged_runs)):
+                        self.local_audit[criterion].setdefault(code, []).append(
+                            {"q": quote, "status": "still_present", "comment": error.get("r", "")})
+                    else:
+                        self.unresolved[criterion].setdefault(code, []).append(error)
+                        self.needs_full_text |= code in GLOBAL_CODES
+
+    def needs_model(self):
+        return bool(self.changed_passages or any(self.unresolved[c] for c in self.unresolved))
+
+    def local_only_result(self):
+        # Nothing changed and nothing left to judge: no model call needed
+        return {
+            "audit": self.local_audit,
+            "new_errors": [],
+            "VOC_CHANGE": "Stayed the same (no changes were made).",
+            "OVERALL": "The new version is the same as the first draft, so every error is still there.",
+        }
+
+    def merge(self, model_audit):
+        # Local still_present entries first, then the model's verdicts, per category
+        merged = {"C1": {}, "C2": {}}
+        for criterion in ("C1", "C2"):
+            for source in (self.local_audit[criterion], model_audit.get("audit", {}).get(criterion, {})):
+                for code, instances in source.items():
+                    if instances:
+                        merged[criterion].setdefault(code, []).extend(instances)
+        return {**model_audit, "audit": merged}
@@ -0,0 +1,186 @@
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+from metrics import percentile
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+def retry_after_seconds(response):
+    # Retry-After is either a number of seconds or an HTTP date
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _KeyState:
+    def __init__(self):
+        self.in_flight = 0
+        self.waiting = deque()
+
+
+class RequestScheduler:
+    """Admission control in front of the model API.
+
+    Each API key gets at most `max_in_flight` concurrent requests; everyone else
+    waits in FIFO order. Retryable responses are retried with jittered
+    exponential backoff so a class-wide burst doesn't come back all at once.
+    """
+
+    def __init__(self, max_in_flight=4, max_retries=4, base_delay=1.0, max_delay=30.0,
+                 retry_exceptions=(), history=500):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_exceptions = tuple(retry_exceptions)
+        self._cond = threading.Condition()
+        self._keys = {}
+        self._latencies = deque(maxlen=history)
+        self._waits = deque(maxlen=history)
+        self._completed = 0
+        self._retries = 0
+        self._started_at = time.monotonic()
+
+    def backoff(self, attempt, response=None):
+        hinted = retry_after_seconds(response)
+        if hinted is not None:
+            # Add a little jitter on top so the whole class doesn't retry in lockstep
+            return min(self.max_delay, hinted) + random.uniform(0, self.base_delay)
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    def queue_position(self, key):
+        with self._cond:
+            state = self._keys.get(key)
+            return len(state.waiting) if state else 0
+
+    def _acquire(self, key, on_queue):
+        ticket = object()
+        with self._cond:
+            state = self._keys.setdefault(key, _KeyState())
+            state.waiting.append(ticket)
+        last_position = None
+        try:
+            while True:
+                with self._cond:
+                    if state.waiting[0] is ticket and state.in_flight < self.max_in_flight:
+                        state.waiting.popleft()
+                        state.in_flight += 1
+                        self._cond.notify_all()
+                        return state
+                    position = state.waiting.index(ticket) + 1
+                    if position == last_position:
+                        self._cond.wait(timeout=0.5)
+                        continue
+                # Outside the lock: the callback does UI work and may raise (a Streamlit rerun)
+                if on_queue:
+                    on_queue(position)
+                last_position = position
+        except BaseException:
+            # A ticket left behind would block every later request for this key
+            with self._cond:
+                state.waiting.remove(ticket)
+                self._cond.notify_all()
+            raise
+
+    def _release(self, state):
+        with self._cond:
+            state.in_flight -= 1
+            self._cond.notify_all()
+
+    def run(self, key, send, on_queue=None):
+        # `send` performs one HTTP attempt and returns the response
+        submitted = time.monotonic()
+        state = self._acquire(key, on_queue)
+        admitted = time.monotonic()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    response = send()
+                except self.retry_exceptions:
+                    if attempt >= self.max_retries:
+                        raise
+                    response = None
+                else:
+                    if response.status_code not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                        return response
+                time.sleep(self.backoff(attempt, response))
+                attempt += 1
+                with self._cond:
+                    self._retries += 1
+        finally:
+            self._release(state)
+            finished = time.monotonic()
+            with self._cond:
+                self._completed += 1
+                self._waits.append(admitted - submitted)
+                self._latencies.append(finished - submitted)
+
+    def stats(self):
+        with self._cond:
+            latencies = list(self._latencies)
+            waits = list(self._waits)
+            elapsed = time.monotonic() - self._started_at
+            return {
+                "completed": self._completed,
+                "retries": self._retries,
+                "in_flight": sum(s.in_flight for s in self._keys.values()),
+                "queued": sum(len(s.waiting) for s in self._keys.values()),
+                "throughput_per_min": 60 * self._completed / elapsed if elapsed else 0.0,
+                "latency_p50": percentile(latencies, 50),
+                "latency_p95": percentile(latencies, 95),
+                "wait_p95": percentile(waits, 95),
+            }
+
+
+if __name__ == "__main__":
+    # Synthetic classroom burst against the local mock:
+    #   python scheduler.py [submissions] [max_in_flight]
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    import requests
+
+    from gemini_client import GeminiClient, GeminiError
+    from mock_gemini import start_mock_server
+
+    submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    max_in_flight = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    # The mock accepts one request fewer than we send at once, so the 429 retry path is exercised
+    server, base_url = start_mock_server(latency=0.8, rate_limit=max(1, max_in_flight - 1))
+    scheduler = RequestScheduler(max_in_flight=max_in_flight, base_delay=0.5,
+                                 retry_exceptions=(requests.ConnectionError,))
+    client = GeminiClient("mock-key", base_url=base_url, scheduler=scheduler)
+
+    def submit(i):
+        try:
+            client.generate(f"ESSAY {i}")
+            return True
+        except GeminiError:
+            return False
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=submissions) as pool:
+        ok = sum(pool.map(submit, range(submissions)))
+    elapsed = time.monotonic() - started
+    server.shutdown()
+
+    stats = scheduler.stats()
+    print(f"{ok}/{submissions} succeeded in {elapsed:.1f}s "
+          f"({60 * submissions / elapsed:.1f} essays/min, {stats['retries']} retries)")
+    print(f"latency p50={stats['latency_p50']:.2f}s p95={stats['latency_p95']:.2f}s "
+          f"queue wait p95={stats['wait_p95']:.2f}s")
@@ -0,0 +1,62 @@
+import numpy as np
+
+from grading import FULL_MARK_WORD_COUNT, GRADING_CONFIG
+
+
+class _CompiledCriterion:
+    def __init__(self, name, config):
+        self.name = name
+        self.start_score = config["start_score"]
+        self.codes = list(config["rules"])
+        self.penalties = np.array([rule["penalty"] for rule in config["rules"].values()])
+        self.once = np.array([rule["type"] == "once" for rule in config["rules"].values()])
+        self.connectors = config.get("connectors")
+
+    def score(self, criterion_results):
+        # criterion_results: one dict per essay, e.g. every data["C1"]
+        n, codes = len(criterion_results), self.codes
+        counts = np.fromiter((len(r.get(code, ())) for r in criterion_results for code in codes),
+                             dtype=float, count=n * len(codes)).reshape(n, len(codes))
+        counts = np.where(self.once, counts > 0, counts)
+        scores = self.start_score - counts @ self.penalties
+
+        if self.connectors:
+            conns = [r.get("CONN", []) for r in criterion_results]
+            total = np.fromiter((len(c) for c in conns), dtype=int, count=len(conns))
+            distinct = np.fromiter((len(set(c)) for c in conns), dtype=int, count=len(conns))
+            weak = (total < self.connectors["min_total"]) | (distinct < self.connectors["min_distinct"])
+            scores -= weak * self.connectors["penalty"]
+        return np.maximum(scores, 0)
+
+
+class ScoringEngine:
+    """GRADING_CONFIG compiled once into penalty/type arrays.
+
+    Scores one parsed result or a whole batch in a single NumPy pass with the
+    same rules as compute_mark, so a term's results can be re-marked after a
+    rubric change without calling the model again. Pass another config for
+    a different task.
+    """
+
+    def __init__(self, config=GRADING_CONFIG, full_mark_word_count=FULL_MARK_WORD_COUNT):
+        self.config = config
+        self.full_mark_word_count = full_mark_word_count
+        self.criteria = [_CompiledCriterion(name, crit) for name, crit in config.items()]
+
+    def score_batch(self, results, word_counts):
+        # Returns {"C1": array, "C2": array, ..., "C3": array, "total": array}
+        marks = {c.name: c.score([r[c.name] for r in results]) for c in self.criteria}
+        marks["C3"] = np.fromiter((float(r["C3"].get("VOC", 1.0)) for r in results),
+                                  dtype=float, count=len(results))
+        total = sum(marks.values())
+        total = np.where(np.asarray(word_counts) < self.full_mark_word_count, total / 2, total)
+
+        rounded = {name: np.round(values, 2) for name, values in marks.items() if name != "C3"}
+        rounded["C3"] = marks["C3"]
+        rounded["total"] = np.round(total, 2)
+        return rounded
+
+    def score(self, data, word_count):
+        # Same tuple as compute_mark: (c1_score, c2_score, c3_score, final_mark)
+        marks = self.score_batch([data], [word_count])
+        return tuple(float(marks[name][0]) for name in ("C1", "C2", "C3", "total"))
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# The parts of st.session_state that survive a browser refresh
+SESSION_FIELDS = ("essay_content", "draft1", "raw_response", "fb1", "fb2")
+
+
+def session_key(group, students, task_id="default"):
+    # Same group and the same names in any order or case are the same session of a task
+    names = sorted(s.strip().lower() for s in students if s.strip())
+    blob = json.dumps([task_id, group.strip(), names], ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class SessionStore:
+    """Per-team progress (drafts, parsed results, rendered feedback) kept in SQLite.
+
+    Streamlit's session state dies with the browser tab; this lets a team that
+    refreshes or comes back later see its feedback again without a model call.
+    """
+
+    def __init__(self, path="sessions.sqlite3", ttl_seconds=14 * 24 * 3600):
+        self.ttl_seconds = ttl_seconds
+        self.restored = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                key TEXT PRIMARY KEY,
+                grp TEXT NOT NULL,
+                students TEXT NOT NULL,
+                state TEXT NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+        self._db.commit()
+
+    def load(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT state, updated FROM sessions WHERE key = ?", (key,)).fetchone()
+            if row is None or time.time() - row[1] > self.ttl_seconds:
+                return None
+            self.restored += 1
+        return json.loads(row[0])
+
+    def save(self, key, group, students, state):
+        now = time.time()
+        record = {field: state.get(field, "") for field in SESSION_FIELDS}
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (key, grp, students, state, updated) VALUES (?, ?, ?, ?, ?)",
+                (key, group, students, json.dumps(record, ensure_ascii=False), now))
+            self._db.execute("DELETE FROM sessions WHERE updated < ?", (now - self.ttl_seconds,))
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            size = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"sessions": size, "restored": self.restored}
@@ -0,0 +1,127 @@
+import json
+import sqlite3
+import threading
+import time
+
+import requests
+
+from metrics import NULL_METRICS
+
+
+class SheetOutbox:
+    """Durable queue of Google Sheet log records, flushed by a background thread.
+
+    Records are committed to SQLite before the student's rerun, so a slow or
+    failing Apps Script endpoint neither blocks the UI nor loses a row.
+    """
+
+    def __init__(self, sheet_url, path="sheet_outbox.sqlite3", batch_size=1,
+                 flush_interval=2.0, max_backoff=300.0, timeout=(5.0, 30.0), metrics=NULL_METRICS):
+        self.sheet_url = sheet_url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.metrics = metrics
+        self.sent = 0
+        self.failures = 0
+        self.last_error = ""
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_next_attempt ON outbox (next_attempt)")
+        self._db.commit()
+        self._worker = threading.Thread(target=self._run, name="sheet-outbox", daemon=True)
+        self._worker.start()
+
+    def enqueue(self, record):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT INTO outbox (payload, created, next_attempt) VALUES (?, ?, ?)",
+                             (json.dumps(record, ensure_ascii=False), now, now))
+            self._db.commit()
+        self._wake.set()
+
+    def _due(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, payload, attempts FROM outbox WHERE next_attempt <= ? ORDER BY id LIMIT ?",
+                (time.time(), self.batch_size)).fetchall()
+
+    def _post(self, records):
+        # A batch size of 1 keeps the original one-row-per-POST format the Apps Script expects
+        body = records[0] if self.batch_size == 1 else {"type": "BATCH", "records": records}
+        response = self._session.post(self.sheet_url, json=body, timeout=self.timeout)
+        response.raise_for_status()
+
+    def flush(self):
+        # Sends every due batch; returns the number of records delivered
+        delivered = 0
+        while True:
+            rows = self._due()
+            if not rows:
+                return delivered
+            ids = [row[0] for row in rows]
+            try:
+                with self.metrics.trace("sheet").span("sheet_post"):
+                    self._post([json.loads(row[1]) for row in rows])
+            except requests.RequestException as e:
+                self._retry_later(rows, e)
+                return delivered
+            with self._lock:
+                self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+                self._db.commit()
+                self.sent += len(ids)
+            delivered += len(ids)
+
+    def _retry_later(self, rows, error):
+        now = time.time()
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self._db.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt = ? WHERE id = ?",
+                [(attempts + 1, now + min(self.max_backoff, 2 ** attempts), row_id)
+                 for row_id, _, attempts in rows])
+            self._db.commit()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Never let the worker die; the rows stay in the outbox
+                self.last_error = str(e)
+
+    def stats(self):
+        with self._lock:
+            depth, oldest = self._db.execute("SELECT COUNT(*), MIN(created) FROM outbox").fetchone()
+        return {
+            "queue_depth": depth,
+            "oldest_pending_seconds": time.time() - oldest if oldest else 0.0,
+            "sent": self.sent,
+            "failed_posts": self.failures,
+            "last_error": self.last_error,
+        }
+
+    def close(self, drain=True):
+        self._stop.set()
+        self._wake.set()
+        self._worker.join()
+        if drain:
+            self.flush()
+        self._session.close()
@@ -0,0 +1,126 @@
+import json
+
+
+class TopLevelObjectParser:
+    """Incremental parser for one streamed JSON object.
+
+    Text is fed as it arrives; every time a top-level member ("C1", "C2", ...)
+    is complete it is decoded and returned, without waiting for the rest of
+    the document. Anything before the first "{" (e.g. a ```json fence) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.members = {}
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._member_start = None
+
+    def feed(self, text):
+        self.buffer += text
+        completed = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            c = buffer[i]
+            if self.done:
+                break
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                if self._depth > 0:
+                    self._in_string = True
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start = i + 1
+            elif c in "}]" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    completed += self._close_member(i)
+                    self.done = True
+            elif c == "," and self._depth == 1:
+                completed += self._close_member(i)
+                self._member_start = i + 1
+        self._pos = len(buffer)
+        return completed
+
+    def _close_member(self, end):
+        member = self.buffer[self._member_start:end].strip()
+        if not member:
+            return []
+        key, value = next(iter(json.loads("{" + member + "}").items()))
+        self.members[key] = value
+        return [(key, value)]
+
+
+def sse_events(lines):
+    # streamGenerateContent?alt=sse sends one "data: {...}" event per chunk
+    for line in lines:
+        if line and line.startswith("data:"):
+            yield json.loads(line[len("data:"):])
+
+
+def chunk_text(chunk):
+    return "".join(part.get("text", "")
+                   for candidate in chunk.get("candidates", [])
+                   for part in candidate.get("content", {}).get("parts", []))
+
+
+def sse_text_fragments(lines):
+    for chunk in sse_events(lines):
+        text = chunk_text(chunk)
+        if text:
+            yield text
+
+
+def replay(lines):
+    # Feeds a recorded SSE stream through the parser; returns the members in completion order
+    parser = TopLevelObjectParser()
+    events = []
+    for fragment in sse_text_fragments(lines):
+        events += parser.feed(fragment)
+    return events, parser
+
+
+def record_chunks(text, sizes=(7, 31, 3, 64, 1, 17)):
+    # Builds an SSE recording of `text` split into uneven chunks, as the API does
+    lines, start, i = [], 0, 0
+    while start < len(text):
+        size = sizes[i % len(sizes)]
+        chunk = {"candidates": [{"content": {"parts": [{"text": text[start:start + size]}]}}]}
+        lines += ["data: " + json.dumps(chunk), ""]
+        start += size
+        i += 1
+    return lines
+
+
+if __name__ == "__main__":
+    # Replay a recorded stream:  python stream_parser.py recording.sse
+    # Without an argument the canned mock answer is chunked and replayed.
+    import sys
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            recording = f.read().splitlines()
+        expected = None
+    else:
+        from mock_gemini import CANNED_FEEDBACK
+        expected = CANNED_FEEDBACK
+        text = "```json\n" + json.dumps(expected, indent=2, ensure_ascii=False) + "\n```"
+        recording = record_chunks(text)
+
+    events, parser = replay(recording)
+    for key, value in events:
+        print(f"{key}: {json.dumps(value, ensure_ascii=False)[:70]}")
+    print("complete" if parser.done else "INCOMPLETE stream")
+    if expected is not None:
+        assert parser.members == expected and [k for k, _ in events] == list(expected)
+        print("replay matches the non-streamed answer")
@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+
+from grading import DEFAULT_TASK, Task
+
+try:
+    import yaml
+except ImportError:  # JSON task files still work without PyYAML
+    yaml = None
+
+TASK_EXTENSIONS = (".json", ".yaml", ".yml")
+
+
+# What a broken file raises while it is read; all of it is reported as ValueError
+_PARSE_ERRORS = (ValueError, yaml.YAMLError) if yaml else (ValueError,)
+
+
+def load_task_file(path):
+    # Returns the spec dict; raises OSError, or ValueError naming the file for a broken one
+    try:
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".json"):
+                spec = json.load(f)
+            elif yaml is None:
+                raise ValueError("install PyYAML to read YAML task files")
+            else:
+                spec = yaml.safe_load(f) or {}
+    except _PARSE_ERRORS as e:
+        raise ValueError(f"{path}: {e}") from e
+    if not isinstance(spec, dict):
+        raise ValueError(f"{path}: a task file must be a mapping of settings, not {type(spec).__name__}")
+    return spec
+
+
+def load_task(task_id, path):
+    # A compiled Task from its file; a spec with the wrong shape is also a ValueError naming the file
+    spec = load_task_file(path)
+    try:
+        return Task(task_id, spec)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"{path}: {e}") from e
+
+
+class TaskRegistry:
+    """Tasks loaded from a directory of JSON/YAML files, one assignment per file.
+
+    The file name without its extension is the task id (`?task=<id>` in the
+    URL). A task is compiled the first time it is asked for and kept until its
+    file changes on disk, so editing a file takes effect on the next request
+    without a restart. The built-in assignment is always available as "default".
+    """
+
+    def __init__(self, directory="tasks", default_task=DEFAULT_TASK):
+        self.directory = directory
+        self.default_task = default_task
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._compiled = {}  # task id -> (path, mtime, Task)
+
+    def _path(self, task_id):
+        if not self.directory or os.sep in task_id or task_id.startswith("."):
+            return None
+        for extension in TASK_EXTENSIONS:
+            path = os.path.join(self.directory, task_id + extension)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def get(self, task_id):
+        # Returns the compiled Task, or None for an unknown id; raises OSError or ValueError for a broken file
+        path = self._path(task_id)
+        if path is None:
+            return self.default_task if task_id == self.default_task.id else None
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._compiled.get(task_id)
+            if cached and cached[0] == path and cached[1] == mtime:
+                return cached[2]
+        task = load_task(task_id, path)
+        with self._lock:
+            if cached:
+                self.reloads += 1
+            self._compiled[task_id] = (path, mtime, task)
+        return task
+
+    def task_ids(self):
+        ids = {self.default_task.id}
+        if self.directory and os.path.isdir(self.directory):
+            ids.update(os.path.splitext(name)[0] for name in os.listdir(self.directory)
+                       if name.endswith(TASK_EXTENSIONS))
+        return sorted(ids)
+
+    def stats(self):
+        with self._lock:
+            return {"compiled": sorted(self._compiled), "reloads": self.reloads}
@@ -0,0 +1,38 @@
+import streamlit as st
+
+
+def render_teacher_view(store, task_ids, config):
+    # Class-level view over the results store: ?view=teacher
+    st.header("📊 Class results")
+    columns = st.columns(2)
+    task = columns[0].selectbox("Task", ["All tasks"] + task_ids)
+    task = None if task == "All tasks" else task
+    group = columns[1].selectbox("Group", ["All groups"] + store.groups(task))
+    group = None if group == "All groups" else group
+
+    summary = store.score_summary(task, group)
+    if not summary:
+        st.info("No graded submissions yet.")
+        return
+
+    st.subheader("Scores")
+    st.dataframe(summary, hide_index=True, use_container_width=True)
+    distribution = store.score_distribution(task, group)
+    chart = {}
+    for row in distribution:
+        chart.setdefault(row["mark"], {})[row["grp"]] = row["submissions"]
+    st.bar_chart([{"mark": mark, **counts} for mark, counts in sorted(chart.items())], x="mark",
+                 x_label="Final mark", y_label="Submissions")
+
+    st.subheader("Most frequent errors (first drafts)")
+    frequencies = store.error_frequencies(task, group, config)
+    st.dataframe([{"Group": r["grp"], "Criterion": r["criterion"], "Error": r["label"], "Code": r["code"],
+                   "Errors": r["errors"], "Submissions with it": r["submissions_with_error"],
+                   "Per submission": r["errors_per_submission"]} for r in frequencies],
+                 hide_index=True, use_container_width=True)
+
+    st.subheader("Fixed in the revision")
+    st.dataframe([{"Criterion": r["criterion"], "Error": r["label"], "Fixed": r["fixed"],
+                   "Incorrectly fixed": r["incorrectly_fixed"], "Still present": r["still_present"],
+                   "New": r["new"], "Fix rate": r["fix_rate"]} for r in store.fix_rates(task, group, config)],
+                 hide_index=True, use_container_width=True)
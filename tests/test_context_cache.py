@@ -0,0 +1,58 @@
+import pytest
+
+from gemini_client import GeminiClient
+from grading import DEFAULT_TASK, REVISION_COACH_PROMPT, build_initial_prompt
+from mock_gemini import start_mock_server
+
+
+@pytest.fixture
+def mock():
+    server, base_url = start_mock_server(latency=0)
+    client = GeminiClient("mock-key", base_url=base_url)
+    yield server, client
+    client.close()
+    server.shutdown()
+
+
+def model_payloads(server):
+    return [payload for path, payload in server.payloads if not path.endswith("/cachedContents")]
+
+
+def test_rubric_is_registered_once_and_not_resent_inline(mock):
+    server, client = mock
+    for essay in ("First essay.", "Second essay."):
+        client.generate(build_initial_prompt(essay), system=DEFAULT_TASK.system)
+
+    created = [payload for path, payload in server.payloads if path.endswith("/cachedContents")]
+    assert len(created) == 1
+    assert created[0]["systemInstruction"]["parts"][0]["text"] == DEFAULT_TASK.system
+    for payload in model_payloads(server):
+        assert payload["cachedContent"] in server.cached_contents
+        assert "systemInstruction" not in payload
+        assert DEFAULT_TASK.system not in str(payload["contents"])
+    assert client.context_cache.stats()["hits"] == 1
+
+
+def test_short_revision_prompt_is_sent_as_system_instruction(mock):
+    server, client = mock
+    assert len(REVISION_COACH_PROMPT) < client.context_cache.min_chars
+    client.generate("ERRORS TO CHECK (JSON):\n[]", system=REVISION_COACH_PROMPT)
+
+    assert server.cached_contents == {}
+    [payload] = model_payloads(server)
+    assert "cachedContent" not in payload
+    assert payload["systemInstruction"]["parts"][0]["text"] == REVISION_COACH_PROMPT
+
+
+def test_expired_cache_resends_the_rubric_inline(mock):
+    server, client = mock
+    client.generate(build_initial_prompt("First essay."), system=DEFAULT_TASK.system)
+    # The cached content expires server-side: the mock answers 404 for it
+    server.cached_contents.clear()
+    client.generate(build_initial_prompt("Second essay."), system=DEFAULT_TASK.system)
+
+    first, expired, resent = model_payloads(server)
+    assert expired["cachedContent"] == first["cachedContent"]
+    assert "cachedContent" not in resent
+    assert resent["systemInstruction"]["parts"][0]["text"] == DEFAULT_TASK.system
+    assert resent["contents"] == expired["contents"]
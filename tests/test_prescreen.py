@@ -0,0 +1,51 @@
+from grading import DEFAULT_TASK
+from prescreen import PreScreen, find_connectors, merge_connectors
+
+# Connectors outside the everyday "and/but/because" set
+CONNECTOR_ESSAY = (
+    "Dear Liam,\n\nNevertheless, we will visit the Vatican when we have a free morning. "
+    "In fact, if it rains we will go to a museum instead. Even though the hotel is small, it is "
+    "near the centre; otherwise we would take a bus. Meanwhile my brother is staying at home, "
+    "nonetheless he is happy for me.\n\nBest wishes,\nAna"
+)
+
+
+def test_less_common_connectors_are_found():
+    found = find_connectors(CONNECTOR_ESSAY)
+    for connector in ("nevertheless", "when", "in fact", "if", "instead", "even though", "otherwise",
+                      "meanwhile", "nonetheless"):
+        assert connector in found
+    assert "though" not in found
+
+
+def test_intensifier_and_word_lists_are_not_connectors():
+    assert find_connectors("I am so happy. We will visit Rome and Florence.") == []
+    assert find_connectors("It rained, so we stayed in and we played cards.") == ["so", "and"]
+
+
+def test_model_connectors_are_kept_and_local_ones_added():
+    assert merge_connectors(["However", "and", "despite"], ["however", "and", "and", "when"]) == \
+        ["However", "and", "despite", "and", "when"]
+
+
+def test_merge_keeps_the_model_list_and_owns_si():
+    screen = PreScreen("We are going to Rome and i am happy, so we will see the Colosseum when we arrive.")
+    data = {"C1": {"CS": [], "CONN": ["and"]}, "C2": {"SI": [{"q": "model", "r": "model"}]}}
+    merged = screen.merge(data)
+    assert merged["C1"]["CONN"] == ["and", "so", "when"]
+    assert [e["q"] for e in merged["C2"]["SI"]] == [e["q"] for e in screen.C2["SI"]]
+    assert data["C1"]["CONN"] == ["and"]
+
+
+def test_connector_essay_does_not_take_the_connector_penalty():
+    screen = PreScreen(CONNECTOR_ESSAY)
+    merged = screen.merge({"C1": {"CONN": []}, "C2": {}})
+    rule = DEFAULT_TASK.config["C1"]["connectors"]
+    assert len(merged["C1"]["CONN"]) >= rule["min_total"]
+    assert len(set(merged["C1"]["CONN"])) >= rule["min_distinct"]
+
+
+def test_introductory_comma_hints_skip_phrase_to_and_however_adverb():
+    for text in ("In addition to Rome we will visit Naples.", "However much it costs, we will go."):
+        assert PreScreen(text + " We are going to the beach with my friends.").hints["IC"] == []
+    assert PreScreen("However we can't go to the beach with my friends.").hints["IC"]
@@ -0,0 +1,25 @@
+from revision_diff import RevisionPlan
+
+ERRORS = {"C2": {"ART": [{"q": "sea", "r": "Use an article."}],
+                 "SpCap": [{"q": "beautifull", "r": "Check the spelling."}]}}
+DRAFT = "We will swim in sea. The beach is beautifull. See you soon."
+
+
+def test_quote_in_an_unchanged_sentence_is_still_present_locally():
+    plan = RevisionPlan(ERRORS, DRAFT, DRAFT.replace("in sea", "in the sea"))
+    assert [e["q"] for e in plan.local_audit["C2"]["SpCap"]] == ["beautifull"]
+    assert plan.local_audit["C2"]["SpCap"][0]["status"] == "still_present"
+
+
+def test_short_quote_in_a_changed_sentence_goes_to_the_model():
+    plan = RevisionPlan(ERRORS, DRAFT, DRAFT.replace("in sea", "in the sea"))
+    assert "ART" not in plan.local_audit["C2"]
+    assert plan.unresolved["C2"]["ART"] == ERRORS["C2"]["ART"]
+    assert plan.changed_passages == ["We will swim in the sea."]
+    assert plan.needs_model()
+
+
+def test_unchanged_draft_needs_no_model_call():
+    plan = RevisionPlan(ERRORS, DRAFT, DRAFT + "\n")
+    assert not plan.needs_model()
+    assert set(plan.local_only_result()["audit"]["C2"]) == {"ART", "SpCap"}
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from mock_gemini import CANNED_FEEDBACK
+from stream_parser import TopLevelObjectParser, record_chunks, replay, sse_text_fragments
+
+
+def test_replay_matches_the_non_streamed_answer():
+    events, parser = replay(record_chunks(json.dumps(CANNED_FEEDBACK)))
+    assert parser.done
+    assert [key for key, _ in events] == list(CANNED_FEEDBACK)
+    assert dict(events) == parser.members == CANNED_FEEDBACK
+
+
+@pytest.mark.parametrize("sizes", [(1,), (2, 5), (7, 31, 3, 64, 1, 17), (10_000,)])
+def test_members_do_not_depend_on_chunk_boundaries(sizes):
+    text = json.dumps(CANNED_FEEDBACK, indent=2, ensure_ascii=False)
+    events, parser = replay(record_chunks(text, sizes))
+    assert [key for key, _ in events] == list(CANNED_FEEDBACK)
+    assert parser.members == CANNED_FEEDBACK
+
+
+def test_fenced_answer_ignores_the_fence():
+    text = "```json\n" + json.dumps(CANNED_FEEDBACK, indent=2, ensure_ascii=False) + "\n```"
+    events, parser = replay(record_chunks(text))
+    assert parser.done
+    assert [key for key, _ in events] == list(CANNED_FEEDBACK)
+    assert parser.members == CANNED_FEEDBACK
+
+
+def test_braces_and_commas_inside_strings_do_not_split_members():
+    answer = {"OVERALL": {"IMP": "Use \"however,\" {not} [this], ok"}, "C3": {"VOC": "1.0"}}
+    events, _ = replay(record_chunks(json.dumps(answer), (3,)))
+    assert events == list(answer.items())
+
+
+def test_each_member_is_returned_as_soon_as_it_is_complete():
+    parser = TopLevelObjectParser()
+    assert parser.feed('{"OVERALL": {"IMP": "ok"}') == []
+    assert parser.feed(', "C3"') == [("OVERALL", {"IMP": "ok"})]
+    assert parser.feed(': {"VOC": "2.0"}}') == [("C3", {"VOC": "2.0"})]
+    assert parser.done
+
+
+def test_truncated_stream_keeps_the_completed_members():
+    text = json.dumps(CANNED_FEEDBACK)
+    events, parser = replay(record_chunks(text[:text.index('"C2"') + 10]))
+    assert not parser.done
+    assert [key for key, _ in events] == ["C1"]
+
+
+def test_malformed_member_raises_after_the_earlier_members():
+    # The app's progressive renderer catches this and leaves the full text to parse_json_response
+    text = '{"OVERALL": {"IMP": "ok"}, "C1": {"CS": [],}, "C3": {"VOC": "1.0"}}'
+    parser = TopLevelObjectParser()
+    events = []
+    with pytest.raises(ValueError):
+        for fragment in sse_text_fragments(record_chunks(text, (5,))):
+            events += parser.feed(fragment)
+    assert events == [("OVERALL", {"IMP": "ok"})]
+    assert "C1" not in parser.members
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from grading import DEFAULT_TASK
+from tasks import TaskRegistry, load_task
+
+BROKEN_FILES = {
+    "yaml_syntax.yaml": "title: [unclosed\n",
+    "yaml_list.yaml": "- a\n- b\n",
+    "json_syntax.json": "{bad",
+    "grading_not_mapping.yaml": "grading: 3\n",
+    "rules_list.yaml": "grading:\n  C1:\n    rules: [1]\n",
+    "rule_not_mapping.yaml": "grading:\n  C1:\n    rules:\n      CS: 2\n",
+    "unknown_code.yaml": "grading:\n  C1:\n    rules:\n      XX: {penalty: 1}\n",
+    "penalty_text.yaml": "grading:\n  C1:\n    rules:\n      CS: {penalty: \"0.2\"}\n",
+    "rule_type.yaml": "grading:\n  C2:\n    rules:\n      SI: {type: each}\n",
+    "start_score_text.yaml": "grading:\n  C1:\n    start_score: four\n",
+    "connectors_missing_key.yaml": "grading:\n  C1:\n    connectors: {min_total: null}\n",
+    "content_points_text.yaml": "content_points: Plans for the trip\n",
+    "min_words_text.json": json.dumps({"min_word_count": "65"}),
+}
+
+
+@pytest.mark.parametrize("name", sorted(BROKEN_FILES))
+def test_broken_task_file_is_a_value_error_naming_the_file(tmp_path, name):
+    path = tmp_path / name
+    path.write_text(BROKEN_FILES[name], encoding="utf-8")
+    with pytest.raises(ValueError, match=name):
+        TaskRegistry(str(tmp_path)).get(path.stem)
+
+
+def test_example_task_file_loads():
+    task = load_task("end_of_year_trip", "tasks/end_of_year_trip.yaml")
+    assert all(isinstance(p, str) for p in task.content_points)
+    assert task.config["C1"]["connectors"] == DEFAULT_TASK.config["C1"]["connectors"]
+
+
+def test_overrides_keep_the_rest_of_the_rubric(tmp_path):
+    (tmp_path / "short.yaml").write_text(
+        "min_word_count: 40\ngrading:\n  C1:\n    rules:\n      CS: {penalty: 0.1}\n    connectors: null\n",
+        encoding="utf-8")
+    task = TaskRegistry(str(tmp_path)).get("short")
+    assert task.min_word_count == 40
+    assert task.config["C1"]["rules"]["CS"] == {**DEFAULT_TASK.config["C1"]["rules"]["CS"], "penalty": 0.1}
+    assert task.config["C1"]["connectors"] is None
+    assert task.config["C2"] == DEFAULT_TASK.config["C2"]